@@ -2,7 +2,13 @@ from mcp.server.fastmcp import FastMCP
 import requests
 from typing import List, Dict, Optional, Any
 from dotenv import load_dotenv
+from pathlib import Path
 import os
+import sys
+
+# Reuse the backend's pooled HTTP client rather than keeping a second copy of it
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from app.services import http_client
 
 load_dotenv()
 
@@ -10,6 +16,9 @@ mcp = FastMCP("Disaster Helper")
 
 token = os.getenv('TOKEN')
 base_url = "http://localhost:8000"
+# The backend answers a help request only after its Gemini task generation, so the
+# report POST gets no fixed read timeout, just this budget for the whole call
+REPORT_DEADLINE_SECONDS = float(os.getenv("REPORT_DEADLINE_SECONDS", "300"))
 headers = {
     'Cookie': f'token={token}',
     'Content-Type': 'application/json'
@@ -19,7 +28,7 @@ headers = {
 def get_current_location() -> tuple[float, float]:
     """Get current location using IP geolocation with proper error handling."""
     try:
-        resp = requests.get("http://ip-api.com/json/", timeout=10)
+        resp = http_client.get("http://ip-api.com/json/")
         resp.raise_for_status()
         data = resp.json()
         
@@ -49,7 +58,7 @@ def get_nearby_disasters() -> dict:
         "longitude": longitude
     }
     
-    response = requests.get(endpoint, headers=auth_headers, params=params)
+    response = http_client.get(endpoint, headers=auth_headers, params=params)
     
     if response.status_code != 200:
         error_msg = response.json().get('error', 'Unknown error')
@@ -92,7 +101,7 @@ def report_emergency(
         "longitude": longitude
     }
     
-    response = requests.post(endpoint, headers=auth_headers, data=data)
+    response = http_client.post(endpoint, headers=auth_headers, data=data, timeout=(3.05, None), deadline=REPORT_DEADLINE_SECONDS)
     
     if response.status_code not in [200, 201]:
         error_msg = response.json().get('error', 'Unknown error')
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
 from app.services.role_service import require_first_responder
 from app.models.user import UserProfile
+from app.services.task_feed import DEFAULT_FEED_RADIUS_KM, get_task_feed
 
 router = APIRouter(prefix="/firstrespond", tags=["First Responders"])
 
@@ -12,3 +14,27 @@ def responder_dashboard(current_user: UserProfile = Depends(require_first_respon
         "department": current_user.department,
         "unit": current_user.unit
     }
+
+@router.get("/tasks")
+def responder_tasks(
+    since: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_km: float = Query(DEFAULT_FEED_RADIUS_KM, gt=0, le=500),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserProfile = Depends(require_first_responder)
+):
+    """Nearby 'fr' tasks changed after the `since` cursor (defaults to the last login location)"""
+    try:
+        return get_task_feed(
+            "fr",
+            latitude if latitude is not None else current_user.latitude,
+            longitude if longitude is not None else current_user.longitude,
+            since=since,
+            radius_km=radius_km,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch tasks: {str(e)}")
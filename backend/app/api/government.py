@@ -1,28 +1,97 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal
 from app.services.role_service import require_government
-from app.services.First_Task_Generation import create_generate_disaster_task_graph
+from app.services.First_Task_Generation import (
+    create_generate_disaster_task_graph,
+    discard_first_task_draft,
+    pending_first_task_draft,
+    promote_first_task_draft,
+    promote_when_ready,
+)
+from app.services.rtdb_writer import WriteBatch, disaster_status_updates
 from app.models.user import UserProfile
 from firebase_admin import db,firestore
+from app.services.metrics import track, start_trace
+from app.services.geo_utils import encode
+from app.services.resource_cache import resource_cache
+from app.services.resource_ingest import ingest_resources
+from app.services.dispatch_index import responder_index
+import asyncio
+import json
+import os
+
+# First tasks generated at once by /emergency/batch (Gemini calls are also bounded by the LLM scheduler)
+GOV_BATCH_CONCURRENCY = int(os.getenv("GOV_BATCH_CONCURRENCY", "4"))
 
 router = APIRouter(prefix="/gov", tags=["Government"])
 
 class DisasterRequest(BaseModel):
     disaster_id: str
 
+class AcceptRequest(DisasterRequest):
+    regenerate: bool = False  # discard the speculative draft and generate the first task now
+
+class BatchDecision(BaseModel):
+    disaster_id: str
+    decision: Literal["accept", "reject"]
+    regenerate: bool = False
+
+class BatchDecisionRequest(BaseModel):
+    decisions: List[BatchDecision] = Field(..., min_length=1, max_length=500)
+
 class ResourcePayload(BaseModel):
     disasterId: str
     data: dict
 
+async def create_first_task(disaster_id: str, regenerate: bool = False, updates: dict = None, wait: bool = True) -> dict:
+    """First task of an accepted disaster; `updates` (its status change) are written with it.
+
+    The speculative draft is promoted when it exists. A draft still being generated is
+    awaited, or with wait=False promoted in the background once ready. Without a usable
+    draft (none, regenerate, or its generation failed) the task is generated now.
+    """
+    start_trace(disaster_id)
+    if regenerate:
+        discard_first_task_draft(disaster_id)
+        await asyncio.to_thread(WriteBatch({**(updates or {}), f"task_drafts/{disaster_id}": None}).commit, "update_disaster_status")
+    else:
+        # The speculative draft and the status change go out in one write
+        task = await asyncio.to_thread(promote_first_task_draft, disaster_id, updates)
+        if task is not None:
+            return {"task_id": task["task_id"], "source": "draft"}
+        if updates:
+            await asyncio.to_thread(WriteBatch(updates).commit, "update_disaster_status")
+        if not wait:
+            promote_when_ready(disaster_id)
+            return {"task_id": None, "source": "pending"}
+        pending = pending_first_task_draft(disaster_id)
+        if pending is not None:
+            # A draft is being generated; waiting for it is cheaper than a second Gemini call
+            try:
+                await asyncio.wrap_future(pending)
+                task = await asyncio.to_thread(promote_first_task_draft, disaster_id)
+            except Exception as e:
+                print(f"First task draft failed for {disaster_id}, generating it directly: {e}")
+            if task is not None:
+                return {"task_id": task["task_id"], "source": "draft"}
+    graph = create_generate_disaster_task_graph()
+    result = await asyncio.to_thread(graph.invoke, {"disaster_id": disaster_id})
+    return {"task_id": result["generated_task"]["task_id"], "source": "regenerated" if regenerate else "generated"}
+
+
 @router.post("/emergency/accept")
-async def accept_disaster(payload: DisasterRequest, user: UserProfile = Depends(require_government)):
+async def accept_disaster(payload: AcceptRequest, user: UserProfile = Depends(require_government)):
     try:
-        ref = db.reference('disasters')
-        ref.child(payload.disaster_id).update({'status': 'active'})
+        first_task = await create_first_task(
+            payload.disaster_id,
+            payload.regenerate,
+            disaster_status_updates(payload.disaster_id, "active"),
+            wait=False,
+        )
         print(f"Disaster {payload.disaster_id} marked as active by {user.name}")
-        graph = create_generate_disaster_task_graph()
-        await graph.invoke({"disaster_id": payload.disaster_id})
-        return {"message": f"Disaster {payload.disaster_id} marked as active."}
+        return {"message": f"Disaster {payload.disaster_id} marked as active.", "first_task": first_task}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
@@ -30,18 +99,126 @@ async def accept_disaster(payload: DisasterRequest, user: UserProfile = Depends(
 @router.post("/emergency/reject")
 async def reject_disaster(payload: DisasterRequest, user: UserProfile = Depends(require_government)):
     try:
-        ref = db.reference('disasters')
-        ref.child(payload.disaster_id).update({'status': 'archived'})
+        discard_first_task_draft(payload.disaster_id)
+        WriteBatch({
+            **disaster_status_updates(payload.disaster_id, "archived"),
+            f"task_drafts/{payload.disaster_id}": None
+        }).commit("update_disaster_status")
         return {"message": f"Disaster {payload.disaster_id} archived."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
+
+@router.post("/emergency/batch")
+async def batch_decide_disasters(payload: BatchDecisionRequest, user: UserProfile = Depends(require_government)):
+    """Accept / reject many disasters at once; streams one NDJSON result line per disaster.
+
+    All status changes go out in one multi-path update, rejected ids are reported right
+    away and accepted ids as their first task is promoted or generated.
+    """
+    decisions = {item.disaster_id: item for item in payload.decisions}  # the last decision per id wins
+
+    def line(result: dict) -> str:
+        return json.dumps(result) + "\n"
+
+    async def results():
+        batch = WriteBatch()
+        for disaster_id, item in decisions.items():
+            if item.decision == "accept":
+                batch.updates.update(disaster_status_updates(disaster_id, "active"))
+            else:
+                discard_first_task_draft(disaster_id)
+                batch.updates.update(disaster_status_updates(disaster_id, "archived"))
+                batch.delete(f"task_drafts/{disaster_id}")
+        try:
+            await asyncio.to_thread(batch.commit, "update_disaster_status")
+        except Exception as e:
+            for disaster_id, item in decisions.items():
+                yield line({"disaster_id": disaster_id, "decision": item.decision, "ok": False, "error": f"Status update failed: {str(e)}"})
+            return
+        print(f"{len(decisions)} disaster decisions applied by {user.name}")
+
+        semaphore = asyncio.Semaphore(GOV_BATCH_CONCURRENCY)
+
+        async def accept(disaster_id: str, regenerate: bool) -> dict:
+            async with semaphore:
+                try:
+                    first_task = await create_first_task(disaster_id, regenerate)
+                    return {"disaster_id": disaster_id, "decision": "accept", "ok": True, "status": "active", "first_task": first_task}
+                except Exception as e:
+                    return {"disaster_id": disaster_id, "decision": "accept", "ok": True, "status": "active",
+                            "first_task": None, "error": f"First task generation failed: {str(e)}"}
+
+        pending = [
+            asyncio.create_task(accept(disaster_id, item.regenerate))
+            for disaster_id, item in decisions.items() if item.decision == "accept"
+        ]
+        for disaster_id, item in decisions.items():
+            if item.decision == "reject":
+                yield line({"disaster_id": disaster_id, "decision": "reject", "ok": True, "status": "archived"})
+        # Tasks keep running if the client disconnects; the statuses are already written
+        for finished in asyncio.as_completed(pending):
+            yield line(await finished)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @router.post("/resource/add")
 async def add_resource(payload: ResourcePayload, user: UserProfile = Depends(require_government)):
     try:
         dbb = firestore.client()
         doc_ref = dbb.collection("resources").document(payload.disasterId)
-        doc_ref.collection("items").add(payload.data)
+        # Geohash lets help requests query only the cells around the requester
+        if payload.data.get("latitude") not in (None, "") and payload.data.get("longitude") not in (None, ""):
+            payload.data["geohash"] = encode(payload.data["latitude"], payload.data["longitude"])
+        with track("firestore", "add_resource"):
+            _, new_ref = doc_ref.collection("items").add(payload.data)
+        resource_cache.add(payload.disasterId, {**payload.data, "resource_id": new_ref.id})
         return {"message": "Resource added successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add resource: {str(e)}")
+
+
+@router.post("/resource/bulk")
+async def bulk_add_resources(disasterId: str, request: Request, format: str = None, user: UserProfile = Depends(require_government)):
+    """Stream NDJSON (default) or CSV resources; the body is parsed and written incrementally"""
+    fmt = (format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")).lower()
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    try:
+        start_trace()
+        return await ingest_resources(disasterId, request.stream(), fmt)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to add resources: {str(e)}")
+
+
+@router.get("/tasks/{disaster_id}/{task_id}/candidates")
+async def task_candidates(
+    disaster_id: str,
+    task_id: str,
+    k: int = Query(10, ge=1, le=100),
+    skills: str = None,
+    user: UserProfile = Depends(require_government)
+):
+    """Closest qualified volunteers / first responders for a task (`skills` is comma separated)"""
+    try:
+        with track("rtdb", "fetch_task"):
+            task = db.reference(f"tasks/{disaster_id}/{task_id}").get()
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+
+        await asyncio.to_thread(responder_index.ensure_loaded)
+        with track("dispatch", "candidates"):
+            candidates = responder_index.candidates(
+                task["latitude"],
+                task["longitude"],
+                task.get("roles", []),
+                text=f"{task.get('description', '')} {task.get('help_needed', '')}",
+                required_skills=skills.split(",") if skills else (),
+                k=k,
+            )
+        return {"task_id": task_id, "roles": task.get("roles", []), "candidates": candidates}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to find candidates: {str(e)}")
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends ,Query,HTTPException
-from typing import List
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends ,Query,HTTPException, WebSocket, WebSocketDisconnect
+from typing import List, Optional
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
 from app.models.user import UserProfile
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.services.auth_service import AuthService
 from app.services.check_disaster import get_nearby_disasters
+from app.services.push_gateway import push_gateway
+from app.services.guide_stream import format_sse
 
 router = APIRouter(prefix="/private", tags=["Private - Any Authenticated User"])
 security = HTTPBearer()
@@ -27,4 +30,63 @@ def nearby_check(
         data = get_nearby_disasters(latitude, longitude) 
         return JSONResponse(content=data)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Push notifications: new disasters and tasks around the subscriber ---
+@router.get("/feed/stream")
+async def feed_stream(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    latitude: Optional[float] = Query(None),
+    longitude: Optional[float] = Query(None)
+):
+    token_payload = auth_service.verify_token(credentials.credentials)
+    profile = await asyncio.to_thread(auth_service.get_user_profile, token_payload["uid"])
+    latitude = latitude if latitude is not None else profile.latitude
+    longitude = longitude if longitude is not None else profile.longitude
+    if latitude is None or longitude is None:
+        raise HTTPException(status_code=400, detail="No location: pass latitude and longitude or set one on your profile")
+
+    async def event_source():
+        # Subscribed only once the response is iterated, so an unsent response leaves nothing behind
+        subscription = push_gateway.subscribe(latitude, longitude, profile.role.value)
+        try:
+            async for item in subscription.events():
+                if item is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield format_sse(*item)
+        finally:
+            push_gateway.unsubscribe(subscription)
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
+@router.websocket("/feed/ws")
+async def feed_websocket(
+    websocket: WebSocket,
+    token: str,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None
+):
+    # Browsers cannot set headers on WebSocket requests, so the token comes as a query parameter
+    try:
+        token_payload = auth_service.verify_token(token)
+        profile = await asyncio.to_thread(auth_service.get_user_profile, token_payload["uid"])
+    except Exception:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    subscription = push_gateway.subscribe(
+        latitude if latitude is not None else profile.latitude,
+        longitude if longitude is not None else profile.longitude,
+        profile.role.value
+    )
+    try:
+        async for item in subscription.events():
+            event, data = item if item is not None else ("ping", {})
+            await websocket.send_json({"event": event, "data": data})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        push_gateway.unsubscribe(subscription)
+
@@ -1,9 +1,15 @@
 from fastapi import APIRouter, Depends, UploadFile, File, Form,HTTPException
+from fastapi.responses import StreamingResponse
 from app.services.role_service import require_user
 from app.models.user import UserProfile
-from typing import Optional
+from typing import List, Optional
 from app.services import emergency_multiagent_workflow as emergency_service
 from app.services.Request_Task_Generation import process_emergency_request
+from app.services.guide_stream import GuideStream, format_sse
+from app.services.report_batch import ingest_report_batch, read_archive, REPORT_BATCH_MAX_BYTES, REPORT_BATCH_MAX_ITEMS
+import asyncio
+import json
+import zipfile
 
 router = APIRouter(prefix="/user", tags=["Users"])
 
@@ -41,6 +47,98 @@ async def emergency_report(
 
     return {"status": "received"}
 
+# --- Emergency Report Endpoint with streamed citizen survival guide (SSE) ---
+@router.post("/emergency/report/stream")
+async def emergency_report_stream(
+    emergencyType: str = Form(...),
+    urgencyLevel: str = Form(...),
+    situation: str = Form(...),
+    peopleCount: str = Form(...),
+    latitude: str = Form(...),
+    longitude: str = Form(...),
+    image: Optional[UploadFile] = File(None),
+    current_user: UserProfile = Depends(require_user)
+):
+    # Read the upload now: the form file is closed once this handler returns the response
+    image_bytes = await image.read() if image is not None else None
+
+    stream = GuideStream()
+    report_task = asyncio.create_task(emergency_service.handle_emergency_report(
+        emergencyType=emergencyType,
+        urgencyLevel=urgencyLevel,
+        situation=situation,
+        peopleCount=peopleCount,
+        latitude=latitude,
+        longitude=longitude,
+        image=image_bytes,
+        user=current_user,
+        guide_stream=stream
+    ))
+    report_task.add_done_callback(lambda _: stream.close())
+
+    async def event_source():
+        # "report" (disaster id) -> "guide" chunks while Gemini generates -> "done" once saved
+        async for event, data in stream.events():
+            yield format_sse(event, data)
+        try:
+            result = await report_task
+            if "error" in result:
+                yield format_sse("error", {"error": result["error"]})
+            else:
+                # The guide already went out as chunks; the government report stays server-side
+                yield format_sse("done", {"disaster_id": result["disaster_id"], "status": result["status"]})
+        except Exception as e:
+            print(f"Error processing streamed emergency report: {e}")
+            yield format_sse("error", {"error": "Failed to process emergency report"})
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
+# --- Bulk report upload for offline field devices (NDJSON progress per item) ---
+@router.post("/emergency/report/batch")
+async def emergency_report_batch(
+    archive: Optional[UploadFile] = File(None),
+    manifest: Optional[str] = Form(None),
+    images: List[UploadFile] = File([]),
+    current_user: UserProfile = Depends(require_user)
+):
+    """Either a zip `archive` with manifest.json and the images, or a JSON `manifest` plus the
+    `images` files. Each manifest entry carries the /emergency/report fields, `image` (file name)
+    and optionally `id` and `submittedTime`."""
+    try:
+        if archive is not None:
+            manifest_items, image_files = await asyncio.to_thread(read_archive, await archive.read())
+        elif manifest:
+            manifest_items = json.loads(manifest)
+            image_files, remaining = {}, REPORT_BATCH_MAX_BYTES
+            for image in images:
+                # Read at most one byte past the cap so an oversized upload is never held in full
+                data = await image.read(remaining + 1)
+                if len(data) > remaining:
+                    raise HTTPException(status_code=413, detail="Batch images are too large")
+                image_files[image.filename] = data
+                remaining -= len(data)
+        else:
+            raise HTTPException(status_code=400, detail="Send an archive or a manifest with images")
+    except HTTPException:
+        raise
+    except (ValueError, KeyError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch upload: {str(e)}")
+
+    if not isinstance(manifest_items, list) or not manifest_items:
+        raise HTTPException(status_code=400, detail="Manifest must be a non-empty list of reports")
+    if len(manifest_items) > REPORT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {REPORT_BATCH_MAX_ITEMS} reports per batch")
+
+    async def progress():
+        try:
+            async for item in ingest_report_batch(manifest_items, image_files, current_user):
+                yield json.dumps(item) + "\n"
+        except Exception as e:
+            print(f"Error processing report batch: {e}")
+            yield json.dumps({"stage": "error", "error": "Failed to process report batch"}) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
 @router.post("/emergency/request")
 async def report_emergency(
     disasterId: str = Form(...),
@@ -79,6 +177,7 @@ async def report_emergency(
                 "status": "received",
                 "message": "Emergency request processed successfully",
                 "task_id": result.get("generated_task", {}).get("task_id"),
+                "coalesced": result.get("coalesced", False),
                 "user_request_saved": True
             }
             
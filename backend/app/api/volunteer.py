@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
 from app.services.role_service import require_volunteer
 from app.models.user import UserProfile
+from app.services.task_feed import DEFAULT_FEED_RADIUS_KM, get_task_feed
 
 router = APIRouter(prefix="/volunteer", tags=["Volunteers"])
 
@@ -10,4 +12,28 @@ def volunteer_dashboard(current_user: UserProfile = Depends(require_volunteer)):
         "message": "Volunteer Dashboard",
         "volunteer": current_user.name,
         "skills": current_user.skills
-    }
\ No newline at end of file
+    }
+
+@router.get("/tasks")
+def volunteer_tasks(
+    since: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_km: float = Query(DEFAULT_FEED_RADIUS_KM, gt=0, le=500),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserProfile = Depends(require_volunteer)
+):
+    """Nearby 'vol' tasks changed after the `since` cursor (defaults to the last login location)"""
+    try:
+        return get_task_feed(
+            "vol",
+            latitude if latitude is not None else current_user.latitude,
+            longitude if longitude is not None else current_user.longitude,
+            since=since,
+            radius_km=radius_km,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch tasks: {str(e)}")
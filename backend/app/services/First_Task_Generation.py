@@ -4,12 +4,45 @@ from firebase_admin import db
 import uuid
 import google.generativeai as genai
 import os
-import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pygeohash as pgh
+from cachetools import TTLCache
+from app.services.task_cache import TaskResponseCache
+from app.services.llm_scheduler import llm_scheduler, urgency_priority, FakeLLM, use_fake_llm
+from app.services.metrics import track, instrumented, submit_with_context, ROLE_DECISIONS
+from app.services.rtdb_writer import WriteBatch
+from app.services.role_rules import classify_roles, fallback_roles, is_confident
+from app.services.llm_json import FirstTaskReply, FallbackTaskReply, json_generation_config, parse_reply, record_outcome
+from app.services.push_gateway import push_gateway, task_notification
 
 # Configure Gemini API
 genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-model = genai.GenerativeModel('gemini-2.0-flash')
+model = FakeLLM() if use_fake_llm() else genai.GenerativeModel('gemini-2.0-flash')
+
+# Reuse Gemini replies for recurring situations in the same area (15 min TTL)
+first_task_cache = TaskResponseCache("first_task", maxsize=256, ttl=900)
+
+def area_cell(latitude, longitude, precision=5) -> str:
+    try:
+        return pgh.encode(float(latitude), float(longitude), precision=precision)
+    except (TypeError, ValueError):
+        return ""
+
+def rule_based_description(roles: list, emergency_type, people, latitude, longitude, situation) -> str:
+    """Task description used when the role is decided without Gemini"""
+    if roles == ["vol", "fr"]:
+        description = f"Coordinate multi-team response to {emergency_type} affecting {people} people at ({latitude}, {longitude}). Establish professional rescue operations and volunteer support systems simultaneously."
+    elif roles == ["fr"]:
+        description = f"Deploy professional emergency response to {emergency_type} at ({latitude}, {longitude}) affecting {people} people."
+    else:
+        description = f"Provide community support and assistance for {emergency_type} situation affecting {people} people at ({latitude}, {longitude})."
+
+    # Add situation context if available
+    if situation and len(situation) > 10:
+        description += f" Situation: {situation[:100]}..."
+    return description
 
 # Define shared state
 class TaskState(TypedDict):
@@ -20,7 +53,8 @@ class TaskState(TypedDict):
 # Tool: Fetch disaster data
 def fetch_disaster_data(state: TaskState) -> TaskState:
     ref = db.reference('disasters')
-    data = ref.child(state['disaster_id']).get()
+    with track("rtdb", "fetch_disaster"):
+        data = ref.child(state['disaster_id']).get()
     if not data:
         raise ValueError("Disaster data not found")
     return {"disaster_data": data, "disaster_id": state['disaster_id']}
@@ -105,18 +139,38 @@ def generate_task(state: TaskState) -> TaskState:
     Respond ONLY with valid JSON.
     """
 
+    cache_context = (people, area_cell(latitude, longitude))
+
     try:
-        response = model.generate_content(prompt)
-        ai_response = response.text.strip()
-        
-        # Clean up the response to extract JSON
-        if ai_response.startswith('```json'):
-            ai_response = ai_response.replace('```json', '').replace('```', '').strip()
-        elif ai_response.startswith('```'):
-            ai_response = ai_response.replace('```', '').strip()
-        
-        # Parse AI response
-        ai_data = json.loads(ai_response)
+        ai_data = first_task_cache.get(emergency_type, urgency, situation, cache_context)
+        cache_hit = ai_data is not None
+        # Clear-cut reports are decided by the keyword rules without calling Gemini
+        decision = None if cache_hit else classify_roles(situation, emergency_type, urgency, people)
+        rule_based = decision is not None and is_confident(decision)
+        ROLE_DECISIONS.labels("first_task", "cache" if cache_hit else "rules" if rule_based else "gemini").inc()
+        if rule_based:
+            ai_data = {
+                "description": rule_based_description(decision["roles"], emergency_type, people, latitude, longitude, situation),
+                "roles": decision["role"],
+                "reasoning": decision["reasoning"],
+            }
+        elif not cache_hit:
+            started = time.time()
+            response = llm_scheduler.run(
+                model.generate_content, prompt,
+                generation_config=json_generation_config(FirstTaskReply),
+                priority=urgency_priority(urgency), label="first_task"
+            )
+            # JSON mode plus local repair (fences, trailing text, single quotes)
+            ai_data = parse_reply(response.text, "first_task")
+            if str(ai_data.get("description", "")).strip():
+                # The description names this disaster's coordinates; only the role decision is shared
+                cached = {"roles": ai_data.get("roles"), "reasoning": ai_data.get("reasoning")}
+                first_task_cache.put(emergency_type, urgency, situation, cached, time.time() - started, cache_context)
+        else:
+            cached_roles = {"both": ["vol", "fr"], "fr": ["fr"]}.get(ai_data.get("roles"), ["vol"])
+            ai_data["description"] = rule_based_description(cached_roles, emergency_type, people, latitude, longitude, situation)
+            print(f"Task cache hit for {emergency_type}/{urgency}: {first_task_cache.get_stats()}")
         
         ai_generated_description = ai_data.get("description", "").strip()
         ai_selected_role = ai_data.get("roles", "vol")
@@ -149,6 +203,9 @@ def generate_task(state: TaskState) -> TaskState:
             "updated_at": current_timestamp,
             "is_fallback": False,
             "first_Task": True,
+            "cache_hit": cache_hit,
+            "rule_based": rule_based,
+            "role_confidence": decision["confidence"] if rule_based else None,
             "ai_reasoning": ai_data.get("reasoning", "AI-determined role assignment")
         }
 
@@ -156,6 +213,7 @@ def generate_task(state: TaskState) -> TaskState:
 
     except Exception as e:
         print(f"Error with AI task generation: {e}")
+        record_outcome("first_task", "retry")
         # Enhanced fallback with basic AI-driven logic
         try:
             # Simplified prompt for fallback
@@ -172,9 +230,12 @@ def generate_task(state: TaskState) -> TaskState:
             }}
             """
             
-            fallback_response = model.generate_content(fallback_prompt)
-            fallback_text = fallback_response.text.strip().replace('```json', '').replace('```', '')
-            fallback_data = json.loads(fallback_text)
+            fallback_response = llm_scheduler.run(
+                model.generate_content, fallback_prompt,
+                generation_config=json_generation_config(FallbackTaskReply),
+                priority=urgency_priority(urgency), label="first_task_fallback"
+            )
+            fallback_data = parse_reply(fallback_response.text, "first_task_fallback")
             
             role_choice = fallback_data.get("roles", "vol")
             if role_choice == "both":
@@ -187,44 +248,9 @@ def generate_task(state: TaskState) -> TaskState:
             description = fallback_data.get("description", f"Respond to {emergency_type} affecting {people} people at coordinates ({latitude}, {longitude}).")
             
         except:
-            # Final rule-based fallback with improved logic for "both" scenarios
-            situation_lower = situation.lower()
-            emergency_lower = emergency_type.lower()
-            
-            # Check for mass casualty or complex situations needing both
-            mass_casualty_keywords = ['many dead', 'multiple casualties', 'mass casualties', 'hundreds', 'thousands', 'devastating', 'widespread']
-            complex_emergency_keywords = ['major', 'large-scale', 'widespread', 'multiple buildings', 'entire neighborhood', 'community-wide']
-            
-            has_mass_casualties = any(keyword in situation_lower for keyword in mass_casualty_keywords)
-            is_complex_emergency = any(keyword in situation_lower for keyword in complex_emergency_keywords) or any(keyword in emergency_lower for keyword in complex_emergency_keywords)
-            
-            # Try to parse people count for scale assessment
-            people_count_high = False
-            try:
-                if people and str(people).isdigit() and int(people) > 50:
-                    people_count_high = True
-                elif any(word in str(people).lower() for word in ['many', 'hundreds', 'thousands', 'community', 'neighborhood']):
-                    people_count_high = True
-            except:
-                pass
-            
-            # Professional response indicators
-            needs_professional = urgency in ["urgent", "high"] or emergency_lower in ["fire", "medical", "collapse", "rescue", "explosion", "gas leak", "hazmat"]
-            
-            # Determine role assignment with improved logic
-            if (has_mass_casualties or is_complex_emergency or people_count_high) and needs_professional:
-                roles = ["vol", "fr"]  # Both needed for complex large-scale emergencies
-                description = f"Coordinate multi-team response to {emergency_type} affecting {people} people at ({latitude}, {longitude}). Establish professional rescue operations and volunteer support systems simultaneously."
-            elif needs_professional:
-                roles = ["fr"]  # Professional response needed
-                description = f"Deploy professional emergency response to {emergency_type} at ({latitude}, {longitude}) affecting {people} people."
-            else:
-                roles = ["vol"]  # Basic volunteer support
-                description = f"Provide community support and assistance for {emergency_type} situation affecting {people} people at ({latitude}, {longitude})."
-            
-            # Add situation context if available
-            if situation and len(situation) > 10:
-                description += f" Situation: {situation[:100]}..."
+            # Final rule-based fallback (any confidence; high urgency defaults to responders)
+            roles = fallback_roles(situation, emergency_type, urgency, people)
+            description = rule_based_description(roles, emergency_type, people, latitude, longitude, situation)
         
         task_id = str(uuid.uuid4())
         task = {
@@ -251,19 +277,125 @@ def generate_task(state: TaskState) -> TaskState:
 # Tool: Save task to Firebase
 def save_task(state: TaskState) -> TaskState:
     ref = db.reference(f"tasks/{state['disaster_id']}")
-    ref.child(state['generated_task']['task_id']).set(state['generated_task'])
+    with track("rtdb", "save_task"):
+        ref.child(state['generated_task']['task_id']).set(state['generated_task'])
+    task = state['generated_task']
+    push_gateway.publish("task", task_notification(state['disaster_id'], task), task['latitude'], task['longitude'], task['roles'])
     return state
 
 # Function to create and return the LangGraph
 def create_generate_disaster_task_graph():
     graph = StateGraph(TaskState)
-    graph.add_node("fetch", fetch_disaster_data)
-    graph.add_node("generate", generate_task)
-    graph.add_node("save", save_task)
+    graph.add_node("fetch", instrumented("first_task_graph", "fetch")(fetch_disaster_data))
+    graph.add_node("generate", instrumented("first_task_graph", "generate")(generate_task))
+    graph.add_node("save", instrumented("first_task_graph", "save")(save_task))
 
     graph.set_entry_point("fetch")
     graph.add_edge("fetch", "generate")
     graph.add_edge("generate", "save")
     graph.set_finish_point("save")
 
-    return graph.compile()
\ No newline at end of file
+    return graph.compile()
+
+# === SPECULATIVE DRAFTS ===
+# The first task is drafted in the background once a report is saved, so accepting the
+# disaster only has to move the draft from task_drafts/{id} to tasks/{id}/{task_id}.
+
+draft_executor = ThreadPoolExecutor(max_workers=2)
+_draft_lock = threading.Lock()
+# Drafts are kept in memory only as a shortcut; evicted ones are read back from task_drafts/
+_drafts = TTLCache(maxsize=256, ttl=3600)  # disaster_id -> draft generated by this process
+_draft_futures = {}  # disaster_id -> Future of a draft being generated (dropped once done)
+# Only needs to outlive a draft generation; after that the stored status protects rejects
+_discarded = TTLCache(maxsize=1024, ttl=3600)  # disaster ids whose in-flight draft must not be saved or promoted
+
+def draft_allowed(disaster_id: str, updates: dict = None) -> bool:
+    """False once the draft was discarded or the disaster archived.
+
+    A status change staged in `updates` (an accept) overrides the stored status.
+    """
+    with _draft_lock:
+        if disaster_id in _discarded:
+            return False
+    if f"disasters/{disaster_id}/status" in (updates or {}):
+        return True
+    with track("rtdb", "fetch_disaster_status"):
+        return db.reference(f"disasters/{disaster_id}/status").get() != "archived"
+
+def generate_first_task_draft(disaster_id: str):
+    """Draft the first task; None when the disaster was rejected or re-generated meanwhile"""
+    state = fetch_disaster_data({"disaster_id": disaster_id})
+    task = generate_task(state)["generated_task"]
+    if not draft_allowed(disaster_id):
+        return None
+    with track("rtdb", "save_task_draft"):
+        db.reference(f"task_drafts/{disaster_id}").set(task)
+    with _draft_lock:
+        _drafts[disaster_id] = task
+    return task
+
+def schedule_first_task_draft(disaster_id: str):
+    """Start drafting the first task in the background; returns the Future"""
+    with _draft_lock:
+        future = _draft_futures.get(disaster_id)
+        if future is not None:
+            return future
+        _discarded.pop(disaster_id, None)
+        future = submit_with_context(draft_executor, generate_first_task_draft, disaster_id)
+        _draft_futures[disaster_id] = future
+
+    def forget(_):
+        with _draft_lock:
+            _draft_futures.pop(disaster_id, None)
+    future.add_done_callback(forget)
+    return future
+
+def pending_first_task_draft(disaster_id: str):
+    """Future of a draft still being generated, or None"""
+    with _draft_lock:
+        return _draft_futures.get(disaster_id)
+
+def discard_first_task_draft(disaster_id: str):
+    """Drop the draft; one still being generated is neither saved nor promoted"""
+    with _draft_lock:
+        _drafts.pop(disaster_id, None)
+        _discarded[disaster_id] = True
+
+def promote_first_task_draft(disaster_id: str, updates: dict = None):
+    """Publish the draft as the disaster's first task, together with `updates`, in one write.
+
+    Returns the promoted task, or None (nothing written) when no draft exists or the
+    draft was discarded / the disaster archived since.
+    """
+    if not draft_allowed(disaster_id, updates):
+        return None
+    with _draft_lock:
+        task = _drafts.pop(disaster_id, None)
+    if task is None:
+        with track("rtdb", "fetch_task_draft"):
+            task = db.reference(f"task_drafts/{disaster_id}").get()
+    if not task:
+        return None
+
+    now = int(time.time())
+    task = {**task, "updated_at": now, "promoted_from_draft": True}
+    batch = WriteBatch(updates)
+    batch.set(f"tasks/{disaster_id}/{task['task_id']}", task)
+    batch.delete(f"task_drafts/{disaster_id}")
+    batch.commit("promote_task_draft")
+    push_gateway.publish("task", task_notification(disaster_id, task), task['latitude'], task['longitude'], task['roles'])
+    return task
+
+def promote_when_ready(disaster_id: str):
+    """Promote the draft as soon as it exists, drafting it now if no generation is running"""
+    future = schedule_first_task_draft(disaster_id)
+
+    def promote(done):
+        if done.exception() is not None:
+            print(f"First task draft failed for {disaster_id}, generating it directly: {done.exception()}")
+            if draft_allowed(disaster_id):
+                submit_with_context(draft_executor, create_generate_disaster_task_graph().invoke, {"disaster_id": disaster_id})
+            return
+        if done.result() is not None:
+            promote_first_task_draft(disaster_id)
+    future.add_done_callback(promote)
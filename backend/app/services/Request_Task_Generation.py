@@ -4,13 +4,30 @@ from firebase_admin import db, firestore
 import uuid
 import google.generativeai as genai
 import os
-import math
 import time
-import json
+import pygeohash as pgh
+from app.services.task_cache import TaskResponseCache
+from app.services.llm_scheduler import llm_scheduler, urgency_priority, FakeLLM, use_fake_llm
+from app.services.metrics import track, instrumented, start_trace
+from app.services.rtdb_writer import WriteBatch
+from app.services.push_gateway import push_gateway, task_notification
+from app.services.geo_utils import cells_around, nearest_k
+from app.services.resource_cache import resource_cache, SEARCH_PRECISIONS
+from app.services.request_coalescer import request_coalescer
+from app.services.role_rules import classify_roles, fallback_roles, is_confident
+from app.services.metrics import ROLE_DECISIONS
+from app.services.llm_json import RequestTaskReply, FallbackTaskReply, json_generation_config, parse_reply, record_outcome
 
 # Configure Gemini API
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel("gemini-2.0-flash")
+model = FakeLLM() if use_fake_llm() else genai.GenerativeModel("gemini-2.0-flash")
+
+NEARBY_RESOURCE_LIMIT = 5
+
+# Reuse Gemini replies for similar help requests in the same area (15 min TTL)
+request_task_cache = TaskResponseCache(
+    "request_task", maxsize=1024, ttl=900, similarity_threshold=0.8
+)
 
 
 # Define shared state
@@ -25,12 +42,15 @@ class EmergencyRequestState(TypedDict):
     nearby_resources: list
     generated_task: dict
     user_request_data: dict
+    pending_writes: dict  # RTDB path -> value, committed together by save_user_request
+    coalesced: bool  # attached to an existing task instead of generating one
 
 
 # Tool: Fetch disaster emergency type
 def fetch_disaster_type(state: EmergencyRequestState) -> EmergencyRequestState:
     ref = db.reference("disasters")
-    data = ref.child(state["disaster_id"]).get()
+    with track("rtdb", "fetch_disaster"):
+        data = ref.child(state["disaster_id"]).get()
     if not data:
         raise ValueError("Disaster data not found")
 
@@ -38,49 +58,112 @@ def fetch_disaster_type(state: EmergencyRequestState) -> EmergencyRequestState:
     return {**state, "emergency_type": emergency_type}
 
 
+# Tool: Attach near-duplicate requests to an open task of the same disaster
+def coalesce_request(state: EmergencyRequestState) -> EmergencyRequestState:
+    task = request_coalescer.match(
+        state["disaster_id"],
+        state["help"],
+        state["urgency_type"],
+        state["latitude"],
+        state["longitude"],
+    )
+    if task is None:
+        return {**state, "coalesced": False}
+
+    task_path = f"tasks/{state['disaster_id']}/{task['task_id']}"
+    task["updated_at"] = int(time.time())
+    pending_writes = {
+        **state.get("pending_writes", {}),
+        f"{task_path}/updated_at": task["updated_at"],
+        f"{task_path}/linked_requests/{state['user_id']}": {
+            "help": state["help"],
+            "urgency_type": state["urgency_type"],
+            "latitude": state["latitude"],
+            "longitude": state["longitude"],
+            "timestamp": task["updated_at"],
+        },
+    }
+    return {**state, "coalesced": True, "generated_task": task, "pending_writes": pending_writes}
+
+
+def route_after_coalesce(state: EmergencyRequestState) -> str:
+    return "save_request" if state.get("coalesced") else "fetch_resources"
+
+
 # Tool: Fetch nearby resources from Firestore
+def query_resource_cells(items_ref, cells: list) -> list:
+    """Resources whose geohash starts with one of the cells (one range query per cell)"""
+    resources = []
+    for cell in cells:
+        query = items_ref.where("geohash", ">=", cell).where("geohash", "<", cell + "~")
+        for resource in query.stream():
+            resource_data = resource.to_dict()
+            resource_data["resource_id"] = resource.id
+            resources.append(resource_data)
+    return resources
+
+
 def fetch_nearby_resources(state: EmergencyRequestState) -> EmergencyRequestState:
+    # Active disasters are served from the in-process cache without touching Firestore
+    try:
+        cached = resource_cache.nearby(
+            state["disaster_id"],
+            float(state["latitude"]),
+            float(state["longitude"]),
+            NEARBY_RESOURCE_LIMIT,
+        )
+        if cached is not None:
+            for resource in cached:
+                resource["distance"] = resource["distance_km"]
+            return {**state, "nearby_resources": cached}
+    except Exception as e:
+        print(f"Error reading resource cache: {e}")
+
     dbb = firestore.client()
 
     try:
-        # Get all resources for this disaster
         resources_ref = (
             dbb.collection("resources")
             .document(state["disaster_id"])
             .collection("items")
         )
-        resources = resources_ref.stream()
-
-        nearby_resources = []
         user_lat = float(state["latitude"])
         user_lon = float(state["longitude"])
 
-        for resource in resources:
-            resource_data = resource.to_dict()
-            if resource_data.get("latitude") and resource_data.get("longitude"):
-                resource_lat = float(resource_data["latitude"])
-                resource_lon = float(resource_data["longitude"])
-
-                # Calculate distance (simple euclidean distance for nearby check)
-                distance = math.sqrt(
-                    (user_lat - resource_lat) ** 2 + (user_lon - resource_lon) ** 2
+        # Search the surrounding geohash cells, widening only when too few are found
+        resources = []
+        for precision in SEARCH_PRECISIONS:
+            with track("firestore", "fetch_resources"):
+                resources = query_resource_cells(
+                    resources_ref, cells_around(user_lat, user_lon, precision)
                 )
+            if len(resources) >= NEARBY_RESOURCE_LIMIT:
+                break
+        # Sparse areas keep what the widest cells returned; resources stored without a
+        # geohash are covered by `python -m app.services.backfill resources`
 
-                # Add distance info to resource data
-                resource_data["distance"] = distance
-                resource_data["resource_id"] = resource.id
-                nearby_resources.append(resource_data)
-
-        # Sort by distance and take closest ones
-        nearby_resources.sort(key=lambda x: x.get("distance", float("inf")))
+        nearby_resources = nearest_k(
+            resources, user_lat, user_lon, NEARBY_RESOURCE_LIMIT
+        )
+        for resource in nearby_resources:
+            resource["distance"] = resource["distance_km"]
 
-        return {**state, "nearby_resources": nearby_resources[:5]}  # Top 5 closest
+        return {**state, "nearby_resources": nearby_resources}  # Top 5 closest
 
     except Exception as e:
         print(f"Error fetching resources: {e}")
         return {**state, "nearby_resources": []}
 
 
+def rule_based_description(help_needed, latitude, longitude, nearby_resources) -> str:
+    """Task description used when the role rules decide without Gemini"""
+    description = f"Assist person needing {help_needed} at location ({latitude}, {longitude})."
+    if nearby_resources:
+        closest_resource = nearby_resources[0]
+        description += f" Coordinate with {closest_resource.get('name', 'nearby resource')} for assistance."
+    return description
+
+
 # Tool: Generate task using AI with intelligent role assignment
 def generate_emergency_task(state: EmergencyRequestState) -> EmergencyRequestState:
     help_needed = state["help"]
@@ -170,18 +253,53 @@ def generate_emergency_task(state: EmergencyRequestState) -> EmergencyRequestSta
     Respond ONLY with valid JSON.
     """
 
-    try:
-        response = model.generate_content(prompt)
-        ai_response = response.text.strip()
-
-        # Clean up the response to extract JSON
-        if ai_response.startswith("```json"):
-            ai_response = ai_response.replace("```json", "").replace("```", "").strip()
-        elif ai_response.startswith("```"):
-            ai_response = ai_response.replace("```", "").strip()
+    cache_context = (
+        pgh.encode(float(latitude), float(longitude), precision=5),
+        ",".join(str(r.get("resource_id", "")) for r in nearby_resources[:3]),
+    )
 
-        # Parse AI response
-        ai_data = json.loads(ai_response)
+    try:
+        ai_data = request_task_cache.get(emergency_type, urgency, help_needed, cache_context)
+        cache_hit = ai_data is not None
+        # Clear-cut requests are decided by the keyword rules without calling Gemini
+        decision = None if cache_hit else classify_roles(help_needed, emergency_type, urgency)
+        rule_based = decision is not None and is_confident(decision)
+        ROLE_DECISIONS.labels("request_task", "cache" if cache_hit else "rules" if rule_based else "gemini").inc()
+        if rule_based:
+            ai_data = {
+                "description": rule_based_description(
+                    help_needed, latitude, longitude, nearby_resources
+                ),
+                "roles": decision["role"],
+                "reasoning": decision["reasoning"],
+                "resource_utilization": "none",
+            }
+        elif not cache_hit:
+            started = time.time()
+            response = llm_scheduler.run(
+                model.generate_content,
+                prompt,
+                generation_config=json_generation_config(RequestTaskReply),
+                priority=urgency_priority(urgency),
+                label="request_task",
+            )
+            # JSON mode plus local repair (fences, trailing text, single quotes)
+            ai_data = parse_reply(response.text, "request_task")
+            if str(ai_data.get("description", "")).strip():
+                # The description names the requester's location; only the role decision is shared
+                request_task_cache.put(
+                    emergency_type,
+                    urgency,
+                    help_needed,
+                    {"roles": ai_data.get("roles"), "reasoning": ai_data.get("reasoning")},
+                    time.time() - started,
+                    cache_context,
+                )
+        else:
+            ai_data["description"] = rule_based_description(
+                help_needed, latitude, longitude, nearby_resources
+            )
+            print(f"Task cache hit for '{help_needed}': {request_task_cache.get_stats()}")
 
         ai_generated_description = ai_data.get("description", "").strip()
         ai_selected_role = ai_data.get("roles", "vol")
@@ -215,6 +333,9 @@ def generate_emergency_task(state: EmergencyRequestState) -> EmergencyRequestSta
             "updated_at": current_timestamp,
             "is_fallback": False,
             "first_Task": False,
+            "cache_hit": cache_hit,
+            "rule_based": rule_based,
+            "role_confidence": decision["confidence"] if rule_based else None,
             "ai_reasoning": ai_data.get("reasoning", "AI-determined role assignment"),
             "resource_utilization": ai_data.get("resource_utilization", "none"),
         }
@@ -223,6 +344,7 @@ def generate_emergency_task(state: EmergencyRequestState) -> EmergencyRequestSta
 
     except Exception as e:
         print(f"Error generating AI task: {e}")
+        record_outcome("request_task", "retry")
 
         # Enhanced fallback with simplified AI prompt
         try:
@@ -237,11 +359,14 @@ def generate_emergency_task(state: EmergencyRequestState) -> EmergencyRequestSta
             }}
             """
 
-            fallback_response = model.generate_content(fallback_prompt)
-            fallback_text = (
-                fallback_response.text.strip().replace("```json", "").replace("```", "")
+            fallback_response = llm_scheduler.run(
+                model.generate_content,
+                fallback_prompt,
+                generation_config=json_generation_config(FallbackTaskReply),
+                priority=urgency_priority(urgency),
+                label="request_task_fallback",
             )
-            fallback_data = json.loads(fallback_text)
+            fallback_data = parse_reply(fallback_response.text, "request_task_fallback")
 
             role_choice = fallback_data.get("roles", "vol")
             if role_choice == "both":
@@ -257,111 +382,12 @@ def generate_emergency_task(state: EmergencyRequestState) -> EmergencyRequestSta
             )
 
         except:
-            # Final intelligent rule-based fallback
-            description = f"Assist person needing {help_needed} at location ({latitude}, {longitude})."
-
-            # Enhanced intelligent role assignment
-            help_lower = help_needed.lower()
-            emergency_lower = emergency_type.lower()
-
-            # Check for inappropriate or joke requests
-            inappropriate_keywords = [
-                "joke",
-                "funny",
-                "lol",
-                "haha",
-                "prank",
-                "fake",
-                "test123",
-                "random",
-            ]
-            is_inappropriate = any(
-                keyword in help_lower for keyword in inappropriate_keywords
+            # Final rule-based fallback (any confidence; high urgency defaults to responders)
+            roles = fallback_roles(help_needed, emergency_type, urgency)
+            description = rule_based_description(
+                help_needed, latitude, longitude, nearby_resources
             )
 
-            if is_inappropriate:
-                description = "Assess situation appropriately and provide guidance on proper emergency procedures. Educate on the importance of using emergency services responsibly."
-                roles = ["vol"]
-            else:
-                # Check for complex situations needing both
-                mass_casualty = any(
-                    keyword in help_lower
-                    for keyword in [
-                        "many people",
-                        "multiple people",
-                        "crowd",
-                        "group",
-                        "families",
-                        "everyone",
-                        "lots of",
-                    ]
-                )
-
-                complex_emergency = any(
-                    keyword in emergency_lower
-                    for keyword in [
-                        "major",
-                        "widespread",
-                        "multiple",
-                        "mass",
-                        "large scale",
-                    ]
-                )
-
-                # Professional responders needed
-                needs_fr = any(
-                    keyword in help_lower
-                    for keyword in [
-                        "medical",
-                        "injury",
-                        "hurt",
-                        "bleeding",
-                        "unconscious",
-                        "chest pain",
-                        "breathing",
-                        "heart",
-                        "ambulance",
-                        "doctor",
-                        "hospital",
-                        "rescue",
-                        "trapped",
-                        "fire",
-                        "smoke",
-                        "gas",
-                        "hazard",
-                        "emergency",
-                        "dying",
-                        "dead",
-                    ]
-                )
-
-                # High urgency situations
-                high_urgency = urgency in ["high", "urgent"] or any(
-                    keyword in help_lower
-                    for keyword in [
-                        "urgent",
-                        "critical",
-                        "immediate",
-                        "emergency",
-                        "asap",
-                        "quickly",
-                        "now",
-                    ]
-                )
-
-                # Determine role assignment
-                if (mass_casualty or complex_emergency) and (needs_fr or high_urgency):
-                    roles = ["vol", "fr"]  # Both needed for complex situations
-                elif needs_fr or high_urgency:
-                    roles = ["fr"]  # Professional response needed
-                else:
-                    roles = ["vol"]  # Basic volunteer support sufficient
-
-            # Add resource coordination if available
-            if nearby_resources and not is_inappropriate:
-                closest_resource = nearby_resources[0]
-                description += f" Coordinate with {closest_resource.get('name', 'nearby resource')} for assistance."
-
         task_id = str(uuid.uuid4())
         task = {
             "task_id": task_id,
@@ -386,14 +412,14 @@ def generate_emergency_task(state: EmergencyRequestState) -> EmergencyRequestSta
         return {**state, "generated_task": task}
 
 
-# Tool: Save task to Firebase Realtime Database
+# Tool: Stage task write (committed with the user request in one round trip)
 def save_task_to_db(state: EmergencyRequestState) -> EmergencyRequestState:
-    ref = db.reference(f"tasks/{state['disaster_id']}")
-    ref.child(state["generated_task"]["task_id"]).set(state["generated_task"])
-    return state
+    task_path = f"tasks/{state['disaster_id']}/{state['generated_task']['task_id']}"
+    pending_writes = {**state.get("pending_writes", {}), task_path: state["generated_task"]}
+    return {**state, "pending_writes": pending_writes}
 
 
-# Tool: Save user request to Firebase Realtime Database
+# Tool: Save user request and staged writes to Firebase Realtime Database
 def save_user_request(state: EmergencyRequestState) -> EmergencyRequestState:
     user_request_data = {
         "disaster_id": state["disaster_id"],
@@ -410,27 +436,72 @@ def save_user_request(state: EmergencyRequestState) -> EmergencyRequestState:
         "ai_reasoning": state["generated_task"].get(
             "ai_reasoning", "No reasoning provided"
         ),
+        "coalesced": state.get("coalesced", False),
     }
 
-    # Save to /userrequest/{user_id}/
-    ref = db.reference(f"userrequest/{state['user_id']}")
-    ref.set(user_request_data)
+    # Save to /userrequest/{user_id}/ together with the staged task
+    batch = WriteBatch(state.get("pending_writes", {}))
+    batch.set(f"userrequest/{state['user_id']}", user_request_data)
+    batch.commit("save_task_and_request")
+
+    task = state["generated_task"]
+    if state.get("coalesced"):
+        # Incremented in the database: other workers coalesce onto the same task.
+        # Responders already have the task, so no new push goes out.
+        with track("rtdb", "increment_request_count"):
+            task["request_count"] = db.reference(
+                f"tasks/{state['disaster_id']}/{task['task_id']}/request_count"
+            ).transaction(lambda count: (count or 1) + 1)
+    else:
+        request_coalescer.register(
+            state["disaster_id"], task, state["help"], state["urgency_type"]
+        )
+        push_gateway.publish(
+            "task",
+            task_notification(state["disaster_id"], task),
+            task["latitude"],
+            task["longitude"],
+            task["roles"],
+        )
 
-    return {**state, "user_request_data": user_request_data}
+    return {**state, "user_request_data": user_request_data, "pending_writes": {}}
 
 
 # Function to create and return the LangGraph
 def create_emergency_request_graph():
     graph = StateGraph(EmergencyRequestState)
 
-    graph.add_node("fetch_disaster", fetch_disaster_type)
-    graph.add_node("fetch_resources", fetch_nearby_resources)
-    graph.add_node("generate_task", generate_emergency_task)
-    graph.add_node("save_task", save_task_to_db)
-    graph.add_node("save_request", save_user_request)
+    graph.add_node(
+        "fetch_disaster",
+        instrumented("request_task_graph", "fetch_disaster")(fetch_disaster_type),
+    )
+    graph.add_node(
+        "coalesce",
+        instrumented("request_task_graph", "coalesce")(coalesce_request),
+    )
+    graph.add_node(
+        "fetch_resources",
+        instrumented("request_task_graph", "fetch_resources")(fetch_nearby_resources),
+    )
+    graph.add_node(
+        "generate_task",
+        instrumented("request_task_graph", "generate_task")(generate_emergency_task),
+    )
+    graph.add_node(
+        "save_task", instrumented("request_task_graph", "save_task")(save_task_to_db)
+    )
+    graph.add_node(
+        "save_request",
+        instrumented("request_task_graph", "save_request")(save_user_request),
+    )
 
     graph.set_entry_point("fetch_disaster")
-    graph.add_edge("fetch_disaster", "fetch_resources")
+    graph.add_edge("fetch_disaster", "coalesce")
+    graph.add_conditional_edges(
+        "coalesce",
+        route_after_coalesce,
+        {"fetch_resources": "fetch_resources", "save_request": "save_request"},
+    )
     graph.add_edge("fetch_resources", "generate_task")
     graph.add_edge("generate_task", "save_task")
     graph.add_edge("save_task", "save_request")
@@ -448,6 +519,7 @@ async def process_emergency_request(
     latitude: str,
     longitude: str,
 ):
+    start_trace()
     graph = create_emergency_request_graph()
 
     initial_state = EmergencyRequestState(
@@ -461,6 +533,8 @@ async def process_emergency_request(
         nearby_resources=[],
         generated_task={},
         user_request_data={},
+        pending_writes={},
+        coalesced=False,
     )
 
     result = await graph.ainvoke(initial_state)
@@ -0,0 +1,85 @@
+import base64
+import os
+import threading
+import uuid
+from io import BytesIO
+
+from PIL import Image
+
+from app.services.metrics import ARTIFACT_BYTES_HELD
+
+# Longest side of the image sent to Gemini; 0 sends the original upload
+LLM_IMAGE_MAX_SIDE = int(os.getenv("LLM_IMAGE_MAX_SIDE", "1024"))
+LLM_IMAGE_QUALITY = 85
+
+
+class ArtifactStore:
+    """Holds large per-report payloads (the uploaded image) outside the graph state.
+
+    Graph state only carries the reference returned by `put`; the bytes are stored
+    once and never copied, and the LLM encoding is computed once per artifact.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._artifacts = {}
+        self._bytes_held = 0
+        self._peak_bytes_held = 0
+
+    def put(self, data: bytes) -> str:
+        ref = uuid.uuid4().hex
+        with self._lock:
+            self._artifacts[ref] = {"data": data, "llm_b64": None, "lock": threading.Lock()}
+            self._bytes_held += len(data)
+            self._peak_bytes_held = max(self._peak_bytes_held, self._bytes_held)
+            ARTIFACT_BYTES_HELD.set(self._bytes_held)
+        return ref
+
+    def get_bytes(self, ref: str) -> bytes:
+        return self._artifacts[ref]["data"]
+
+    def view(self, ref: str) -> memoryview:
+        """Zero-copy read-only view of the artifact"""
+        return memoryview(self._artifacts[ref]["data"])
+
+    def open_stream(self, ref: str) -> BytesIO:
+        """File-like reader; BytesIO shares the bytes buffer until it is written to"""
+        return BytesIO(self._artifacts[ref]["data"])
+
+    def llm_image_b64(self, ref: str) -> str:
+        """Base64 image for Gemini, downscaled to LLM_IMAGE_MAX_SIDE and cached per artifact"""
+        artifact = self._artifacts[ref]
+        with artifact["lock"]:
+            if artifact["llm_b64"] is None:
+                data = artifact["data"]
+                image = Image.open(BytesIO(data))
+                if LLM_IMAGE_MAX_SIDE and max(image.size) > LLM_IMAGE_MAX_SIDE:
+                    image = image.convert("RGB")
+                    image.thumbnail((LLM_IMAGE_MAX_SIDE, LLM_IMAGE_MAX_SIDE))
+                    buffer = BytesIO()
+                    image.save(buffer, format="JPEG", quality=LLM_IMAGE_QUALITY)
+                    data = buffer.getvalue()
+                artifact["llm_b64"] = base64.b64encode(data).decode("utf-8")
+                with self._lock:
+                    self._bytes_held += len(artifact["llm_b64"])
+                    self._peak_bytes_held = max(self._peak_bytes_held, self._bytes_held)
+                    ARTIFACT_BYTES_HELD.set(self._bytes_held)
+            return artifact["llm_b64"]
+
+    def release(self, ref: str):
+        with self._lock:
+            artifact = self._artifacts.pop(ref, None)
+            if artifact is not None:
+                self._bytes_held -= len(artifact["data"]) + len(artifact["llm_b64"] or "")
+                ARTIFACT_BYTES_HELD.set(self._bytes_held)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "artifacts": len(self._artifacts),
+                "bytes_held": self._bytes_held,
+                "peak_bytes_held": self._peak_bytes_held
+            }
+
+
+artifact_store = ArtifactStore()
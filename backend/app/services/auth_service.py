@@ -2,6 +2,8 @@ from firebase_admin import firestore
 from fastapi import HTTPException
 from app.models.user import UserSignup, UserLogin, UserProfile, Token,Status
 from app.services.jwt_service import JWTService
+from app.services.metrics import track
+from app.services.dispatch_index import responder_index
 from datetime import datetime
 import bcrypt
 import uuid
@@ -72,6 +74,7 @@ class AuthService:
                     user_doc["position"] = user_data.position
 
             self.db.collection("users").document(user_uid).set(user_doc)
+            responder_index.upsert(user_doc)
 
             return {"message": "User created successfully", "uid": user_uid}
 
@@ -82,7 +85,8 @@ class AuthService:
         
     def login_user(self, login_data: UserLogin):
         try:
-            users = self.db.collection("users").where("email", "==", login_data.email).get()
+            with track("firestore", "fetch_user_by_email"):
+                users = self.db.collection("users").where("email", "==", login_data.email).get()
             
             if not users:
                 raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -97,12 +101,14 @@ class AuthService:
             geohash_value = geohash.encode(login_data.latitude, login_data.longitude,precision=4)
             
             # Update user's location and geohash in Firestore
-            self.db.collection("users").document(user_data["uid"]).update({
-                "latitude": login_data.latitude,
-                "longitude": login_data.longitude,
-                "geohash": geohash_value,
-                "last_location_update": datetime.now().isoformat()
-            })
+            with track("firestore", "update_user_location"):
+                self.db.collection("users").document(user_data["uid"]).update({
+                    "latitude": login_data.latitude,
+                    "longitude": login_data.longitude,
+                    "geohash": geohash_value,
+                    "last_location_update": datetime.now().isoformat()
+                })
+            responder_index.upsert({**user_data, "latitude": login_data.latitude, "longitude": login_data.longitude})
             
             token_payload = {
                 "uid": str(user_data["uid"]),
@@ -158,7 +164,8 @@ class AuthService:
     
     def get_user_profile(self, uid: str):
         try:
-            user_doc = self.db.collection("users").document(uid).get()
+            with track("firestore", "fetch_user_profile"):
+                user_doc = self.db.collection("users").document(uid).get()
             if not user_doc.exists:
                 raise HTTPException(status_code=404, detail="User not found")
             
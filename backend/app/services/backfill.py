@@ -0,0 +1,106 @@
+import sys
+
+import pygeohash as pgh
+from firebase_admin import db, firestore
+
+from app.services.geo_utils import encode
+from app.services.rtdb_writer import WriteBatch
+
+FIRESTORE_BATCH_LIMIT = 500
+RTDB_PAGE_SIZE = 200
+
+
+def backfill_resource_geohashes() -> dict:
+    """Store a geohash on resources created before geohashes were written.
+
+    Nearby-resource lookups only run geohash range queries, so a resource without
+    one is invisible to them until this has run.
+    """
+    dbb = firestore.client()
+    stats = {"scanned": 0, "updated": 0, "skipped": 0}
+    batch, pending = dbb.batch(), 0
+    for disaster_doc in dbb.collection("resources").list_documents():
+        for resource in disaster_doc.collection("items").stream():
+            stats["scanned"] += 1
+            data = resource.to_dict() or {}
+            if data.get("geohash"):
+                continue
+            try:
+                geohash = encode(data["latitude"], data["longitude"])
+            except (KeyError, TypeError, ValueError):
+                stats["skipped"] += 1
+                continue
+            batch.update(resource.reference, {"geohash": geohash})
+            stats["updated"] += 1
+            pending += 1
+            if pending == FIRESTORE_BATCH_LIMIT:
+                batch.commit()
+                batch, pending = dbb.batch(), 0
+    if pending:
+        batch.commit()
+    return stats
+
+
+def backfill_disaster_index() -> dict:
+    """Write disaster_index entries for disasters saved before the index existed.
+
+    The task feeds and report deduplication only look disasters up through the index.
+    """
+    # Imported here: the workflow module loads the CNN and Gemini clients
+    from app.services.emergency_multiagent_workflow import build_disaster_index_entry
+
+    disasters_ref = db.reference("disasters")
+    stats = {"scanned": 0, "updated": 0, "skipped": 0}
+    last_key = None
+    while True:
+        query = disasters_ref.order_by_key()
+        if last_key is not None:
+            query = query.start_at(last_key)
+        page = query.limit_to_first(RTDB_PAGE_SIZE + (last_key is not None)).get() or {}
+        page.pop(last_key, None)
+        if not page:
+            break
+        indexed = set()
+        for cell in {disaster.get("geohash") for disaster in page.values() if isinstance(disaster, dict)} - {None}:
+            # Status changes of unindexed disasters leave entries holding only `status`
+            entries = db.reference(f"disaster_index/{cell}").get() or {}
+            indexed.update(key for key, entry in entries.items() if isinstance(entry, dict) and "latitude" in entry)
+        batch = WriteBatch()
+        for disaster_id, disaster in page.items():
+            stats["scanned"] += 1
+            if not isinstance(disaster, dict) or disaster_id in indexed:
+                continue
+            try:
+                geohash = disaster.get("geohash") or pgh.encode(float(disaster["latitude"]), float(disaster["longitude"]), precision=4)
+                batch.set(f"disaster_index/{geohash}/{disaster_id}", build_disaster_index_entry(disaster))
+            except (KeyError, TypeError, ValueError):
+                stats["skipped"] += 1
+                continue
+            stats["updated"] += 1
+        batch.commit("backfill_disaster_index")
+        last_key = max(page)
+    return stats
+
+
+BACKFILLS = {
+    "resources": backfill_resource_geohashes,
+    "disaster_index": backfill_disaster_index,
+}
+
+
+if __name__ == "__main__":
+    # python -m app.services.backfill [resources] [disaster_index]   (from backend/, next to serviceAccountKey.json)
+    import firebase_admin
+    from firebase_admin import credentials
+
+    names = sys.argv[1:] or list(BACKFILLS)
+    unknown = [name for name in names if name not in BACKFILLS]
+    if unknown:
+        sys.exit(f"Unknown backfill {', '.join(unknown)}; choose from {', '.join(BACKFILLS)}")
+
+    firebase_admin.initialize_app(credentials.Certificate("./serviceAccountKey.json"), {
+        'storageBucket': 'disaster-b6076.firebasestorage.app',
+        'databaseURL': 'https://disaster-b6076-default-rtdb.firebaseio.com/'
+    })
+    for name in names:
+        print(f"{name}: {BACKFILLS[name]()}")
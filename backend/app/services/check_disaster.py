@@ -2,6 +2,7 @@ import geohash as pgh
 import time
 from typing import List
 from firebase_admin import db  
+from app.services.metrics import track
 
 EXCLUDED_KEYS = {
     "gdac_disasters",
@@ -15,7 +16,8 @@ def get_nearby_disasters(latitude: float, longitude: float) -> List[dict]:
     geohash_prefix = pgh.encode(latitude, longitude, precision=4)
     one_week_ago = int(time.time()) - 7 * 24 * 60 * 60
 
-    snapshot = db.reference("disasters").get()
+    with track("rtdb", "fetch_disasters"):
+        snapshot = db.reference("disasters").get()
     results = []
 
     if not snapshot:
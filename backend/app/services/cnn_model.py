@@ -35,32 +35,54 @@ def load_disaster_model(path, device):
 def load_yolo_model():
     return YOLO('../../../Model/yolov8n.pt')
 
-def analyze_image_with_summary(image_input, disaster_model, yolo_model, device):
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406],
-                             [0.229, 0.224, 0.225])
-    ])
-    classes = ['earthquake', 'fire', 'flood', 'normal']
+TRANSFORM = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406],
+                         [0.229, 0.224, 0.225])
+])
+CLASSES = ['earthquake', 'fire', 'flood', 'normal']
 
+def load_image(image_input):
     if isinstance(image_input, BytesIO):
-        image = Image.open(image_input).convert('RGB')
+        return Image.open(image_input).convert('RGB')
     elif isinstance(image_input, Image.Image):
-        image = image_input.convert('RGB')
+        return image_input.convert('RGB')
     else:
         raise TypeError("image_input must be a PIL.Image or BytesIO object")
 
-    input_tensor = transform(image).unsqueeze(0).to(device)
+def format_summary(disaster, people, conf):
+    return f"The image likely shows a {disaster.upper()} scene with {people} {'people' if people != 1 else 'person'} detected. (Confidence: {conf*100:.1f}%)"
+
+def analyze_image_with_summary(image_input, disaster_model, yolo_model, device):
+    image = load_image(image_input)
+
+    input_tensor = TRANSFORM(image).unsqueeze(0).to(device)
     with torch.no_grad():
         pred = torch.nn.functional.softmax(disaster_model(input_tensor), dim=1)
-    disaster = classes[torch.argmax(pred)]
+    disaster = CLASSES[torch.argmax(pred)]
     conf = torch.max(pred).item()
 
     results = yolo_model(image, conf=0.4, verbose=False)
     people = sum(1 for r in results for b in r.boxes if int(b.cls) == 0)
 
-    return f"The image likely shows a {disaster.upper()} scene with {people} {'people' if people != 1 else 'person'} detected. (Confidence: {conf*100:.1f}%)"
+    return format_summary(disaster, people, conf)
+
+def analyze_images_with_summary(image_inputs, disaster_model, yolo_model, device):
+    """Batched analyze_image_with_summary: one CNN forward pass and one YOLO call for all images"""
+    images = [load_image(image_input) for image_input in image_inputs]
+    if not images:
+        return []
+
+    input_tensor = torch.stack([TRANSFORM(image) for image in images]).to(device)
+    with torch.no_grad():
+        pred = torch.nn.functional.softmax(disaster_model(input_tensor), dim=1)
+    confs, indices = torch.max(pred, dim=1)
+
+    results = yolo_model(images, conf=0.4, verbose=False)
+    people = [sum(1 for b in r.boxes if int(b.cls) == 0) for r in results]
+
+    return [format_summary(CLASSES[int(index)], count, conf.item()) for index, count, conf in zip(indices, people, confs)]
 
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 disaster_model = load_disaster_model('../Model/best_intellihack_model.pth', device)
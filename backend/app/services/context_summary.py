@@ -0,0 +1,118 @@
+import json
+
+import numpy as np
+
+GDACS_TOP_N = 5
+HEAVY_RAIN_MM_PER_HOUR = 7.6
+STRONG_WIND_KMH = 50
+
+
+def compact_json(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (~4 characters per token), for comparing prompt variants"""
+    return (len(text) + 3) // 4
+
+
+def _series(hourly: dict, name: str) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in hourly.get(name, [])], dtype=float)
+
+
+def _current_index(hourly: dict, current: dict) -> int:
+    """Index of the current hour in the hourly arrays (Open-Meteo returns the whole day)"""
+    times = hourly.get("time", [])
+    now = str(current.get("time", ""))[:13]
+    for index, value in enumerate(times):
+        if str(value)[:13] >= now:
+            return index
+    return 0
+
+
+def _nan_extreme(values: np.ndarray, extreme):
+    """np.nanmax / np.nanmin that returns None for empty or all-null series"""
+    return None if not values.size or np.isnan(values).all() else extreme(values)
+
+
+def _round(value, digits=1):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def summarize_weather(weather: dict) -> dict:
+    """Derived features of an Open-Meteo forecast instead of its raw hourly / daily arrays"""
+    if not weather or "error" in weather:
+        return {"error": (weather or {}).get("error", "no weather data")}
+
+    current = weather.get("current_weather", {})
+    hourly = weather.get("hourly", {})
+    start = _current_index(hourly, current)
+    precipitation = _series(hourly, "precipitation")[start:]
+    wind = _series(hourly, "wind_speed_10m")[start:]
+    temperature = _series(hourly, "temperature_2m")[start:]
+
+    def window(values: np.ndarray, hours: int) -> np.ndarray:
+        values = values[:hours]
+        return values[~np.isnan(values)]
+
+    summary = {
+        "current": {
+            "temperature_c": current.get("temperature"),
+            "wind_kmh": current.get("windspeed"),
+            "wind_direction_deg": current.get("winddirection"),
+            "weather_code": current.get("weathercode"),
+        },
+    }
+
+    for hours in (24, 72):
+        rain = window(precipitation, hours)
+        gusts = window(wind, hours)
+        summary[f"next_{hours}h"] = {
+            "precipitation_mm": _round(rain.sum()) if rain.size else None,
+            "heavy_rain_hours": int((rain >= HEAVY_RAIN_MM_PER_HOUR).sum()),
+            "peak_wind_kmh": _round(gusts.max()) if gusts.size else None,
+            "peak_wind_in_hours": int(gusts.argmax()) if gusts.size else None,
+            "strong_wind_hours": int((gusts >= STRONG_WIND_KMH).sum()),
+        }
+
+    temps = window(temperature, 72)
+    if temps.size:
+        # Least-squares slope of the next 72 hours, in degrees per day
+        slope = np.polyfit(np.arange(temps.size), temps, 1)[0] * 24 if temps.size > 1 else 0.0
+        summary["temperature_72h"] = {
+            "min_c": _round(temps.min()),
+            "max_c": _round(temps.max()),
+            "trend_c_per_day": _round(slope, 2),
+        }
+
+    daily = weather.get("daily", {})
+    daily_rain = _series(daily, "precipitation_sum")
+    if daily_rain.size:
+        summary["week"] = {
+            "precipitation_mm": _round(np.nansum(daily_rain)),
+            "wettest_day": daily.get("time", [None] * daily_rain.size)[int(np.nanargmax(daily_rain))] if not np.isnan(daily_rain).all() else None,
+            "max_c": _round(_nan_extreme(_series(daily, "temperature_2m_max"), np.nanmax)),
+            "min_c": _round(_nan_extreme(_series(daily, "temperature_2m_min"), np.nanmin)),
+        }
+    return summary
+
+
+def summarize_gdacs(gdac: dict, top_n: int = GDACS_TOP_N) -> dict:
+    """The nearest GDACS events with only the fields the prompts use"""
+    if not gdac or "error" in gdac:
+        return {"error": (gdac or {}).get("error", "no GDACS data")}
+    events = sorted(gdac.get("nearby_disasters", []), key=lambda event: event.get("distance_km", float("inf")))
+    return {
+        "search_radius_km": gdac.get("search_location", {}).get("search_radius_km"),
+        "events_found": gdac.get("total_disasters_found", len(events)),
+        "nearest_events": [
+            {
+                "type": event.get("event_type"),
+                "title": event.get("title"),
+                "severity": event.get("severity"),
+                "distance_km": event.get("distance_km"),
+                "published": event.get("published_date"),
+            }
+            for event in events[:top_n]
+        ],
+    }
@@ -0,0 +1,297 @@
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import firestore
+
+from app.services.geo_utils import cells_around, encode, haversine_km
+from app.services.metrics import track
+from app.services.task_cache import tokenize
+
+# Task role codes -> user roles
+TASK_ROLES = {"vol": "volunteer", "fr": "first_responder"}
+RESPONDER_ROLES = tuple(TASK_ROLES.values())
+RESPONDER_INDEX_TTL = 300
+# Search rings: ~5 km, ~40 km, ~150 km cells (each with neighbours)
+SEARCH_PRECISIONS = (5, 4, 3)
+
+
+class ResponderIndex:
+    """In-memory index of volunteers and first responders for task dispatch.
+
+    Responders are bucketed by geohash cell at every search precision and their skills
+    are kept in an inverted index (skill word -> uids), so a query only scores the
+    responders in the cells around the task. Logins and signups upsert the responder;
+    the whole index is reloaded from Firestore after RESPONDER_INDEX_TTL seconds.
+    Loads read Firestore without holding the index lock; upserts and removals made
+    meanwhile are replayed onto the loaded index.
+    """
+
+    def __init__(self, ttl: int = RESPONDER_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._responders = {}
+        self._cells = {precision: defaultdict(set) for precision in SEARCH_PRECISIONS}
+        self._skills = defaultdict(set)
+        self._loaded_at = None
+        self._refreshing = False
+        self._first_load_lock = threading.Lock()
+        self._changes = None  # ("upsert", user) / ("remove", uid) made while a load runs
+        self._loader = ThreadPoolExecutor(max_workers=1)
+        self._stats = {"queries": 0, "total_query_seconds": 0.0, "max_query_seconds": 0.0, "loads": 0}
+
+    # --- maintenance ---
+
+    @staticmethod
+    def _responder(user: dict):
+        if user.get("role") not in RESPONDER_ROLES:
+            return None
+        try:
+            latitude, longitude = float(user["latitude"]), float(user["longitude"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return {
+            "uid": user["uid"],
+            "name": user.get("name"),
+            "role": user["role"],
+            "status": user.get("status", "normal"),
+            "latitude": latitude,
+            "longitude": longitude,
+            "geohash": encode(latitude, longitude),
+            "skills": tokenize(" ".join(user.get("skills") or [])),
+        }
+
+    @staticmethod
+    def _insert(responder: dict, responders: dict, cells: dict, skills: dict):
+        responders[responder["uid"]] = responder
+        for precision in SEARCH_PRECISIONS:
+            cells[precision][responder["geohash"][:precision]].add(responder["uid"])
+        for skill in responder["skills"]:
+            skills[skill].add(responder["uid"])
+
+    def upsert(self, user: dict):
+        """Add or move a responder; other roles are ignored"""
+        responder = self._responder(user)
+        if responder is None:
+            return
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append(("upsert", responder))
+            self._upsert(responder)
+
+    def remove(self, uid: str):
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append(("remove", uid))
+            self._remove(uid)
+
+    def _upsert(self, responder: dict):
+        self._remove(responder["uid"])
+        self._insert(responder, self._responders, self._cells, self._skills)
+
+    def _remove(self, uid: str):
+        with self._lock:
+            responder = self._responders.pop(uid, None)
+            if responder is None:
+                return
+            for precision in SEARCH_PRECISIONS:
+                self._cells[precision][responder["geohash"][:precision]].discard(uid)
+            for skill in responder["skills"]:
+                self._skills[skill].discard(uid)
+
+    def load(self, users):
+        """Rebuild the index off-lock and swap it in, so queries are not blocked"""
+        responders = {}
+        cells = {precision: defaultdict(set) for precision in SEARCH_PRECISIONS}
+        skills = defaultdict(set)
+        for user in users:
+            responder = self._responder(user)
+            if responder is not None:
+                self._insert(responder, responders, cells, skills)
+        with self._lock:
+            self._responders, self._cells, self._skills = responders, cells, skills
+            for change, value in self._changes or ():
+                if change == "upsert":
+                    self._upsert(value)
+                else:
+                    self._remove(value)
+            self._changes = None
+            self._loaded_at = time.time()
+            self._stats["loads"] += 1
+
+    def _load_from_firestore(self):
+        with self._lock:
+            self._changes = []
+        try:
+            query = firestore.client().collection("users").where("role", "in", list(RESPONDER_ROLES))
+            with track("firestore", "load_responder_index"):
+                users = [doc.to_dict() for doc in query.stream()]
+            self.load(users)
+        except Exception as e:
+            with self._lock:
+                self._changes = None
+            print(f"Error loading responder index: {e}")
+            raise
+        finally:
+            self._refreshing = False
+
+    def ensure_loaded(self):
+        """Load synchronously the first time, refresh in the background once stale"""
+        if self._loaded_at is None:
+            # Only first-time callers wait on each other; queries and upserts keep running
+            with self._first_load_lock:
+                if self._loaded_at is None:
+                    self._refreshing = True
+                    self._load_from_firestore()
+        elif time.time() - self._loaded_at > self.ttl and not self._refreshing:
+            self._refreshing = True
+            self._loader.submit(self._load_from_firestore)
+
+    # --- queries ---
+
+    def candidates(self, latitude, longitude, roles, text: str = "", required_skills=(), k: int = 10) -> list:
+        """Best k responders for a task at (latitude, longitude).
+
+        `roles` are task role codes ('vol', 'fr'). `required_skills` filters responders
+        through the inverted skill index; words of `text` (task description / help text)
+        that are known skills improve the rank of responders who have them. Closer
+        responders and responders with more matching skills rank first. Responders who
+        are themselves in an emergency are skipped.
+        """
+        start = time.perf_counter()
+        wanted_roles = {TASK_ROLES.get(role, role) for role in roles} or set(RESPONDER_ROLES)
+        latitude, longitude = float(latitude), float(longitude)
+
+        with self._lock:
+            allowed = None
+            for skill in tokenize(" ".join(required_skills)):
+                uids = self._skills.get(skill, set())
+                allowed = uids if allowed is None else allowed & uids
+            wanted_skills = tokenize(text) & self._skills.keys()
+
+            def eligible(uids):
+                if allowed is not None:
+                    uids = uids & allowed if isinstance(uids, set) else allowed.intersection(uids)
+                return [uid for uid in uids if self._eligible(uid, wanted_roles)]
+
+            for precision in SEARCH_PRECISIONS:
+                cells = self._cells[precision]
+                found = eligible(set().union(*(cells.get(cell, ()) for cell in cells_around(latitude, longitude, precision))))
+                if len(found) >= k:
+                    break
+            else:
+                found = eligible(self._responders.keys())
+
+            ranked = []
+            for uid in found:
+                responder = self._responders[uid]
+                distance = haversine_km(latitude, longitude, responder["latitude"], responder["longitude"])
+                matched = responder["skills"] & wanted_skills
+                ranked.append({
+                    "uid": uid,
+                    "name": responder["name"],
+                    "role": responder["role"],
+                    "distance_km": round(distance, 3),
+                    "matched_skills": sorted(matched),
+                    "score": round(distance / (1 + len(matched)), 3),
+                })
+        ranked.sort(key=lambda candidate: candidate["score"])
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["total_query_seconds"] += elapsed
+            self._stats["max_query_seconds"] = max(self._stats["max_query_seconds"], elapsed)
+        return ranked[:k]
+
+    def _eligible(self, uid: str, roles: set) -> bool:
+        responder = self._responders[uid]
+        return responder["role"] in roles and responder["status"] != "emergency"
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["responders"] = len(self._responders)
+            stats["skills"] = sum(1 for uids in self._skills.values() if uids)
+        stats["avg_query_ms"] = round(stats["total_query_seconds"] / stats["queries"] * 1000, 3) if stats["queries"] else 0.0
+        stats["max_query_ms"] = round(stats.pop("max_query_seconds") * 1000, 3)
+        stats.pop("total_query_seconds")
+        return stats
+
+
+responder_index = ResponderIndex()
+
+
+BENCH_SKILLS = ("first aid", "cpr", "swimming", "driving", "boat", "medical", "rescue", "cooking", "electrician", "translation")
+
+
+def bench(users: int = 100_000, queries: int = 1_000, seed: int = 7) -> dict:
+    """Candidate query latency on a synthetic index, against a scan of every responder.
+
+    Responders are spread around a few city centres so some cells are dense and others empty.
+    """
+    rng = random.Random(seed)
+    centres = [(rng.uniform(8, 30), rng.uniform(70, 90)) for _ in range(20)]
+
+    def point():
+        latitude, longitude = rng.choice(centres)
+        return latitude + rng.gauss(0, 0.5), longitude + rng.gauss(0, 0.5)
+
+    population = []
+    for i in range(users):
+        latitude, longitude = point()
+        population.append({
+            "uid": f"user{i}", "name": f"User {i}", "role": rng.choice(RESPONDER_ROLES),
+            "status": "emergency" if rng.random() < 0.02 else "normal",
+            "latitude": latitude, "longitude": longitude, "skills": rng.sample(BENCH_SKILLS, 2),
+        })
+
+    index = ResponderIndex()
+    start = time.perf_counter()
+    index.load(population)
+    load_seconds = time.perf_counter() - start
+
+    tasks = [(*point(), [rng.choice(list(TASK_ROLES))], f"need {rng.choice(BENCH_SKILLS)} near the river")
+             for _ in range(queries)]
+
+    def timed(query):
+        latencies = []
+        for latitude, longitude, roles, text in tasks:
+            start = time.perf_counter()
+            query(latitude, longitude, roles, text)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        return {
+            "p50_ms": round(latencies[len(latencies) // 2], 3),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+            "max_ms": round(latencies[-1], 3),
+        }
+
+    def scan(latitude, longitude, roles, text, k=10):
+        wanted_roles = {TASK_ROLES[role] for role in roles}
+        wanted_skills = tokenize(text)
+        ranked = []
+        for responder in index._responders.values():
+            if responder["role"] in wanted_roles and responder["status"] != "emergency":
+                distance = haversine_km(latitude, longitude, responder["latitude"], responder["longitude"])
+                ranked.append((distance / (1 + len(responder["skills"] & wanted_skills)), responder["uid"]))
+        return sorted(ranked)[:k]
+
+    return {
+        "responders": index.get_stats()["responders"],
+        "queries": queries,
+        "load_seconds": round(load_seconds, 3),
+        "candidates": timed(index.candidates),
+        "full_scan": timed(scan),
+    }
+
+
+if __name__ == "__main__":
+    # python -m app.services.dispatch_index --bench [users] [queries]
+    if sys.argv[1:2] != ["--bench"]:
+        sys.exit("usage: python -m app.services.dispatch_index --bench [users] [queries]")
+    print(json.dumps(bench(*(int(arg) for arg in sys.argv[2:4])), indent=2))
@@ -1,6 +1,18 @@
 from app.services.cnn_model import analyze_image_with_summary, disaster_model, yolo_model, device
-from io import BytesIO
-import base64
+from app.services import http_client
+from app.services.llm_scheduler import llm_scheduler, urgency_priority, FakeLLM, use_fake_llm
+from app.services.guide_stream import register_stream, get_stream, unregister_stream
+from app.services.metrics import track, instrumented, submit_with_context, start_trace, current_trace_id
+from app.services.matrix_log import MatrixLogCollector
+from app.services.artifact_store import artifact_store
+from app.services.rtdb_writer import WriteBatch
+from app.services.push_gateway import push_gateway
+from app.services.llm_json import parse_reply
+from app.services.First_Task_Generation import schedule_first_task_draft
+from app.services.context_summary import summarize_weather, summarize_gdacs, compact_json, estimate_tokens
+from app.services.guide_cache import guide_cache, guide_area, guide_key, GUIDE_PERSONALIZE
+from app.services.report_dedup import report_deduplicator, image_dhash, REPORT_DEDUP_ENABLED
+import asyncio
 import requests
 from typing import TypedDict
 from langchain_core.messages import HumanMessage
@@ -16,10 +28,28 @@ from datetime import datetime
 import xml.etree.ElementTree as ET
 import math
 
-gemini = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=os.getenv("GOOGLE_API_KEY"))
+gemini = FakeLLM() if use_fake_llm() else ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=os.getenv("GOOGLE_API_KEY"))
+
+# "split": one Gemini call per AI agent, "combined": one call producing both documents
+AI_ANALYSIS_MODE = os.getenv("AI_ANALYSIS_MODE", "split")
+
+# "compact": prompts carry derived weather features and the nearest GDACS events, "raw": the full API payloads
+PROMPT_CONTEXT_MODE = os.getenv("PROMPT_CONTEXT_MODE", "compact")
+
+# Images above this size are sent as a resumable upload in CHUNK_SIZE pieces (must be a multiple of 256 KB)
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 4 * 256 * 1024
+
+# Search radius for GDACS events around a report
+GDACS_RADIUS_KM = 20
+
+# Background pool for Firebase Storage uploads so they overlap with the analysis pipeline
+upload_executor = ThreadPoolExecutor(max_workers=4)
 
 class EmergencyState(TypedDict):
-    image_bytes: bytes
+    disaster_id: str
+    image_ref: str  # artifact_store reference to the uploaded image
+    image_phash: str  # dHash of the image, matched against later reports of the same scene
     emergencyType: str
     urgencyLevel: str
     situation: str
@@ -29,6 +59,9 @@ class EmergencyState(TypedDict):
     cnn_result: str
     weather: dict
     gdac_disasters: dict
+    weather_summary: dict
+    gdac_summary: dict
+    prompt_context: dict  # context mode and estimated prompt tokens (raw vs compact)
     government_report: str
     citizen_survival_guide: str
     user_id: str
@@ -41,25 +74,17 @@ class EmergencyState(TypedDict):
     agents_status: dict
     parallel_tasks_completed: bool
     analysis_ready: bool
-    ai_matrix_logs: list  
+    ai_matrix_logs: MatrixLogCollector  # shared by reference with the parallel workers
+    ai_usage: dict
+    citizen_guide_timing: dict
+    guide_cache_key: tuple  # (emergency type, geohash cell, CNN class, weather bucket)
 
 # === LOGGING UTILITY ===
 def add_log_to_matrix(state: EmergencyState, message: str, component: str = "system", level: str = "info"):
     """Add a log entry to the AI matrix logs"""
     if "ai_matrix_logs" not in state:
-        state["ai_matrix_logs"] = []
-    
-    log_entry = {
-        "timestamp": datetime.now().isoformat(),
-        "unix_timestamp": time.time(),
-        "component": component,
-        "level": level,
-        "message": message
-    }
-    state["ai_matrix_logs"].append(log_entry)
-    
-    # Also print for console output
-    print(message)
+        state["ai_matrix_logs"] = MatrixLogCollector()
+    state["ai_matrix_logs"].add(message, component, level)
 
 # === UTILITY FUNCTIONS ===
 def upload_image_to_firebase_storage(image_bytes: bytes, disaster_id: str) -> str:
@@ -67,20 +92,23 @@ def upload_image_to_firebase_storage(image_bytes: bytes, disaster_id: str) -> st
     try:
         bucket = storage.bucket()
         blob = bucket.blob(f"disaster_images/{disaster_id}.jpg")
-        blob.upload_from_string(image_bytes, content_type='image/jpeg')
-        blob.make_public()
+        if len(image_bytes) > RESUMABLE_UPLOAD_THRESHOLD:
+            blob.chunk_size = UPLOAD_CHUNK_SIZE
+        with track("storage", "upload_image"):
+            blob.upload_from_string(image_bytes, content_type='image/jpeg')
+            blob.make_public()
         return blob.public_url
     except Exception as e:
         error_msg = f"Error uploading image: {str(e)}"
         print(error_msg)
         return ""
 
-def generate_geohash_date_uuid(latitude, longitude) -> str:
-    """Generate a unique ID based on geohash and timestamp"""
+def generate_geohash_date_uuid(latitude, longitude, timestamp: float = None) -> str:
+    """Generate a unique ID based on geohash and timestamp (now unless given, e.g. an offline capture time)"""
     lat = float(latitude)
     lon = float(longitude)
     geohash = pgh.encode(lat, lon, precision=4)
-    timestamp = str(int(time.time()))
+    timestamp = str(int(time.time() if timestamp is None else timestamp))
     unique_id = f"{geohash}_{timestamp}_{str(uuid.uuid4())[:8]}"
     return unique_id
 
@@ -175,93 +203,171 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     r = 6371  # Radius of earth in kilometers
     return c * r
 
-def save_to_realtime_database(state: EmergencyState, disaster_id: str, processing_time: float):
-    """Save disaster data to Firebase Realtime Database"""
-    try:
-        ref = db.reference('disasters')
-        disaster_data = {
-            'disaster_id': disaster_id,
+def build_disaster_record(state: EmergencyState, disaster_id: str, processing_time: float) -> dict:
+    """Disaster record stored under disasters/{id}"""
+    return {
+        'disaster_id': disaster_id,
+        'emergency_type': state['emergencyType'],
+        'urgency_level': state['urgencyLevel'],
+        'situation': state['situation'],
+        'people_count': state['peopleCount'],
+        'latitude': float(state['latitude']),
+        'longitude': float(state['longitude']),
+        'government_report': state['government_report'],
+        'citizen_survival_guide': state['citizen_survival_guide'],
+        'user_id': state['user_id'],
+        'submitted_time': state['submitted_time'],
+        'ai_processing_time': float(processing_time),
+        'status': 'pending',
+        'image_url': state['image_url'],
+        'image_phash': state.get('image_phash', ''),
+        'citizen_guide_ttft': state.get('citizen_guide_timing', {}).get('time_to_first_token'),
+        'citizen_guide_total_time': state.get('citizen_guide_timing', {}).get('total_time'),
+        'citizen_guide_source': state.get('citizen_guide_timing', {}).get('source', 'generated'),
+        # Capture time: offline reports are uploaded long after the event
+        'created_at': state['submitted_time'],
+        'geohash': pgh.encode(float(state['latitude']), float(state['longitude']), precision=4)
+    }
+
+def build_disaster_index_entry(disaster_data: dict) -> dict:
+    """Small summary stored under disaster_index/{geohash}/{id} for area lookups"""
+    return {
+        'emergency_type': disaster_data['emergency_type'],
+        'urgency_level': disaster_data['urgency_level'],
+        'people_count': disaster_data.get('people_count', ''),
+        'latitude': disaster_data['latitude'],
+        'longitude': disaster_data['longitude'],
+        'status': disaster_data['status'],
+        'created_at': disaster_data['created_at'],
+        'image_phash': disaster_data.get('image_phash', '')
+    }
+
+def build_ai_matrix_record(state: EmergencyState, disaster_id: str) -> dict:
+    """AI matrix record stored under ai_matrixes/{id}"""
+    # Calculate processing statistics
+    total_components = len(state["agents_status"])
+    completed_components = sum(1 for status in state["agents_status"].values() if status == "completed")
+    failed_components = sum(1 for status in state["agents_status"].values() if status == "failed")
+    
+    return {
+        'disaster_id': disaster_id,
+        'created_at': time.time(),
+        'created_at_iso': datetime.now().isoformat(),
+        'processing_start_time': state['ai_processing_start_time'],
+        'processing_end_time': state['ai_processing_end_time'],
+        'total_processing_time': state['ai_processing_end_time'] - state['ai_processing_start_time'],
+        'components_summary': {
+            'total_components': total_components,
+            'completed_components': completed_components,
+            'failed_components': failed_components,
+            'success_rate': (completed_components / total_components * 100) if total_components > 0 else 0
+        },
+        'components_status': state['agents_status'],
+        'final_status': state['status'],
+        'trace_id': current_trace_id(),
+        **state['ai_matrix_logs'].flush(),
+        'ai_analysis_mode': AI_ANALYSIS_MODE,
+        'ai_usage': state.get('ai_usage', {}),
+        'prompt_context': state.get('prompt_context', {}),
+        'emergency_context': {
             'emergency_type': state['emergencyType'],
             'urgency_level': state['urgencyLevel'],
-            'situation': state['situation'],
             'people_count': state['peopleCount'],
-            'latitude': float(state['latitude']),
-            'longitude': float(state['longitude']),
-            'government_report': state['government_report'],
-            'citizen_survival_guide': state['citizen_survival_guide'],
-            'user_id': state['user_id'],
-            'submitted_time': state['submitted_time'],
-            'ai_processing_time': float(processing_time),
-            'status': 'pending',
-            'image_url': state['image_url'],
-            'created_at': time.time(),
-            'geohash': pgh.encode(float(state['latitude']), float(state['longitude']), precision=4)
+            'latitude': state['latitude'],
+            'longitude': state['longitude']
         }
-        
-        ref.child(disaster_id).set(disaster_data)
-        print(f"Disaster {disaster_id} saved to Realtime Database")
-        return True
-    except Exception as e:
-        print(f"Error saving to Realtime Database: {str(e)}")
-        return False
+    }
+
+def stage_report_records(batch: WriteBatch, state: EmergencyState, disaster_id: str, processing_time: float) -> dict:
+    """Add the disaster record, AI matrix and area index entry of one report to `batch`"""
+    disaster_data = build_disaster_record(state, disaster_id, processing_time)
+    batch.set(f"disasters/{disaster_id}", disaster_data)
+    batch.set(f"ai_matrixes/{disaster_id}", build_ai_matrix_record(state, disaster_id))
+    batch.set(f"disaster_index/{disaster_data['geohash']}/{disaster_id}", build_disaster_index_entry(disaster_data))
+    return disaster_data
 
-def save_ai_matrix_to_database(state: EmergencyState, disaster_id: str):
-    """Save AI matrix logs to Firebase Realtime Database"""
+def publish_saved_report(disaster_id: str, disaster_data: dict):
+    push_gateway.publish(
+        "disaster",
+        {"disaster_id": disaster_id, **build_disaster_index_entry(disaster_data)},
+        disaster_data['latitude'],
+        disaster_data['longitude'],
+    )
+
+def save_report_records(state: EmergencyState, disaster_id: str, processing_time: float):
+    """Save disaster record, AI matrix and area index entry in one atomic multi-path update"""
     try:
-        ref = db.reference('ai_matrixes')
-        
-        # Calculate processing statistics
-        total_components = len(state["agents_status"])
-        completed_components = sum(1 for status in state["agents_status"].values() if status == "completed")
-        failed_components = sum(1 for status in state["agents_status"].values() if status == "failed")
-        
-        ai_matrix_data = {
-            'disaster_id': disaster_id,
-            'created_at': time.time(),
-            'created_at_iso': datetime.now().isoformat(),
-            'processing_start_time': state['ai_processing_start_time'],
-            'processing_end_time': state['ai_processing_end_time'],
-            'total_processing_time': state['ai_processing_end_time'] - state['ai_processing_start_time'],
-            'components_summary': {
-                'total_components': total_components,
-                'completed_components': completed_components,
-                'failed_components': failed_components,
-                'success_rate': (completed_components / total_components * 100) if total_components > 0 else 0
-            },
-            'components_status': state['agents_status'],
-            'final_status': state['status'],
-            'logs': state.get('ai_matrix_logs', []),
-            'emergency_context': {
-                'emergency_type': state['emergencyType'],
-                'urgency_level': state['urgencyLevel'],
-                'people_count': state['peopleCount'],
-                'latitude': state['latitude'],
-                'longitude': state['longitude']
-            }
-        }
-        
-        ref.child(disaster_id).set(ai_matrix_data)
-        print(f"AI Matrix for disaster {disaster_id} saved to Realtime Database")
+        batch = WriteBatch()
+        disaster_data = stage_report_records(batch, state, disaster_id, processing_time)
+        batch.commit("save_report")
+        print(f"Disaster {disaster_id} and AI Matrix saved to Realtime Database")
+        publish_saved_report(disaster_id, disaster_data)
         return True
     except Exception as e:
-        print(f"Error saving AI Matrix to Realtime Database: {str(e)}")
+        print(f"Error saving to Realtime Database: {str(e)}")
         return False
 
+async def attach_corroborating_report(duplicate: dict, report_id: str, report: dict, image_bytes: bytes, guide_stream=None):
+    """Record a near-duplicate report under corroborations/{disaster_id}/{report_id} instead of a new disaster.
+
+    Returns None (nothing written) when the disaster has no citizen guide to hand out,
+    the report then goes through the full pipeline.
+    """
+    disaster_id = duplicate["disaster_id"]
+    with track("rtdb", "fetch_citizen_guide"):
+        guide = await asyncio.to_thread(db.reference(f"disasters/{disaster_id}/citizen_survival_guide").get) or ""
+    if not guide or guide.startswith("Error"):
+        return None
+    if guide_stream is not None:
+        guide_stream.publish("report", {"disaster_id": disaster_id, "corroborates": True})
+
+    # The photo is still worth keeping as evidence, only the analysis is skipped
+    image_url = await asyncio.to_thread(upload_image_to_firebase_storage, image_bytes, f"{disaster_id}_{report_id}")
+    record = {
+        **report,
+        'report_id': report_id,
+        'image_url': image_url,
+        'distance_km': duplicate['distance_km'],
+        'hash_distance': duplicate['hash_distance'],
+        'created_at': time.time()
+    }
+    await asyncio.to_thread(WriteBatch({
+        f"corroborations/{disaster_id}/{report_id}": record,
+        f"disasters/{disaster_id}/last_corroborated_at": record['created_at']
+    }).commit, "save_corroboration")
+
+    if guide_stream is not None:
+        guide_stream.publish("guide", {"text": guide})
+    print(f"Report {report_id} attached to {disaster_id} as corroboration: {report_deduplicator.get_stats()}")
+    return {
+        "disaster_id": disaster_id,
+        "report_id": report_id,
+        "corroborated": True,
+        "citizen_survival_guide": guide,
+        "image_url": image_url,
+        "status": "corroborated"
+    }
+
 # === AI AGENTS (True AI-powered components with prompting) ===
 
-def government_analysis_ai_agent(state: EmergencyState) -> EmergencyState:
-    """AI Agent: Government Response Analysis using Gemini AI"""
-    add_log_to_matrix(state, "🤖 AI AGENT: Government Analysis - Generating government report using Gemini AI...", "ai_agent_government", "info")
-    
-    if not state.get("analysis_ready", False):
-        add_log_to_matrix(state, "❌ AI AGENT: Government Analysis - Cannot proceed: insufficient data", "ai_agent_government", "error")
-        state["government_report"] = "Error: Insufficient data for analysis"
-        state["agents_status"]["government_analysis_ai"] = "failed"
-        return state
-    
-    image_bytes = state["image_bytes"]
-    img_b64 = base64.b64encode(image_bytes).decode("utf-8")
+def weather_context(state: EmergencyState) -> str:
+    if PROMPT_CONTEXT_MODE == "raw" or not state.get("weather_summary"):
+        return str(state['weather'])
+    return compact_json(state["weather_summary"])
+
+def gdac_context(state: EmergencyState) -> str:
+    if PROMPT_CONTEXT_MODE == "raw" or not state.get("gdac_summary"):
+        return str(state['gdac_disasters'])
+    return compact_json(state["gdac_summary"])
 
+def citizen_weather_context(state: EmergencyState) -> str:
+    if PROMPT_CONTEXT_MODE == "raw" or not state.get("weather_summary"):
+        return str(state['weather'].get('current_weather', {}))
+    # The summary is small enough to give citizens the outlook as well as current conditions
+    return f"{compact_json(state['weather_summary'])}\n    - Nearby GDACS Events: {compact_json(state['gdac_summary'].get('nearest_events', []))}"
+
+def build_government_prompt(state: EmergencyState) -> str:
+    """Prompt for the government response report"""
     government_context = f"""
     EMERGENCY SITUATION REPORT FOR GOVERNMENT RESPONSE TEAM
     
@@ -273,11 +379,11 @@ def government_analysis_ai_agent(state: EmergencyState) -> EmergencyState:
     - GPS Coordinates: {state['latitude']}, {state['longitude']}
     
     AI Analysis Results: {state['cnn_result']}
-    Weather Data: {state['weather']}
-    Historical Disasters (GDAC): {state['gdac_disasters']}
+    Weather Data: {weather_context(state)}
+    Historical Disasters (GDAC): {gdac_context(state)}
     """
 
-    gov_prompt = f"""
+    return f"""
     {government_context}
     
     You are analyzing this emergency for GOVERNMENT RESPONSE COORDINATION. Create a comprehensive government report with:
@@ -308,52 +414,18 @@ def government_analysis_ai_agent(state: EmergencyState) -> EmergencyState:
     Format as a formal government emergency response report.
     """
 
-    try:
-        response = gemini.invoke([
-            HumanMessage(
-                content=[
-                    {"type": "text", "text": gov_prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{img_b64}"
-                        }
-                    }
-                ]
-            )
-        ])
-        state["government_report"] = response.content
-        state["agents_status"]["government_analysis_ai"] = "completed"
-        add_log_to_matrix(state, "✅ AI AGENT: Government Analysis - Report generated successfully", "ai_agent_government", "success")
-    except Exception as e:
-        state["government_report"] = f"Error generating government report: {str(e)}"
-        state["agents_status"]["government_analysis_ai"] = "failed"
-        add_log_to_matrix(state, f"❌ AI AGENT: Government Analysis - Failed: {str(e)}", "ai_agent_government", "error")
-    
-    return state
-
-def citizen_survival_ai_agent(state: EmergencyState) -> EmergencyState:
-    """AI Agent: Citizen Survival Guide using Gemini AI"""
-    add_log_to_matrix(state, "🤖 AI AGENT: Citizen Survival - Generating survival guide using Gemini AI...", "ai_agent_citizen", "info")
-    
-    if not state.get("analysis_ready", False):
-        add_log_to_matrix(state, "❌ AI AGENT: Citizen Survival - Cannot proceed: insufficient data", "ai_agent_citizen", "error")
-        state["citizen_survival_guide"] = "Error: Insufficient data for guidance"
-        state["agents_status"]["citizen_survival_ai"] = "failed"
-        return state
-    
-    image_bytes = state["image_bytes"]
-    img_b64 = base64.b64encode(image_bytes).decode("utf-8")
-
+def build_citizen_prompt(state: EmergencyState) -> str:
+    """Prompt for the citizen survival guide (cell centre, not the exact position: guides are cached per cell)"""
+    area_lat, area_lon = guide_area(state['latitude'], state['longitude'])
     citizen_context = f"""
     CITIZEN SITUATION:
     - Emergency Type: {state['emergencyType']}
-    - Your Location: {state['latitude']}, {state['longitude']}
-    - Current Weather: {state['weather'].get('current_weather', {})}
+    - Your Area (approximate centre): {area_lat}, {area_lon}
+    - Current Weather: {citizen_weather_context(state)}
     - Number of People with You: {state['peopleCount']}
     """
 
-    citizen_prompt = f"""
+    return f"""
     {citizen_context}
     
     You are providing SURVIVAL INSTRUCTIONS for civilians in this emergency situation. Create a practical survival guide with:
@@ -384,23 +456,101 @@ def citizen_survival_ai_agent(state: EmergencyState) -> EmergencyState:
     Write in simple, clear language that anyone can understand. Focus on PRACTICAL actions, not technical analysis.
     """
 
+def build_image_message(prompt: str, image_ref: str) -> HumanMessage:
+    """Multimodal message carrying the prompt and the report image"""
+    img_b64 = artifact_store.llm_image_b64(image_ref)
+    return HumanMessage(
+        content=[
+            {"type": "text", "text": prompt},
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{img_b64}"
+                }
+            }
+        ]
+    )
+
+def record_ai_usage(state: EmergencyState, agent: str, response, started: float):
+    """Record tokens sent/received and wall-clock time of one Gemini call"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    state["ai_usage"][agent] = {
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "latency_seconds": round(time.time() - started, 3)
+    }
+    add_log_to_matrix(state, f"   📏 {agent}: {state['ai_usage'][agent]['input_tokens']} input tokens, {state['ai_usage'][agent]['latency_seconds']}s ({PROMPT_CONTEXT_MODE} context)", agent, "info")
+
+def government_analysis_ai_agent(state: EmergencyState) -> EmergencyState:
+    """AI Agent: Government Response Analysis using Gemini AI"""
+    add_log_to_matrix(state, "🤖 AI AGENT: Government Analysis - Generating government report using Gemini AI...", "ai_agent_government", "info")
+    
+    if not state.get("analysis_ready", False):
+        add_log_to_matrix(state, "❌ AI AGENT: Government Analysis - Cannot proceed: insufficient data", "ai_agent_government", "error")
+        state["government_report"] = "Error: Insufficient data for analysis"
+        state["agents_status"]["government_analysis_ai"] = "failed"
+        return state
+
     try:
-        response = gemini.invoke([
-            HumanMessage(
-                content=[
-                    {"type": "text", "text": citizen_prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{img_b64}"
-                        }
-                    }
-                ]
-            )
-        ])
-        state["citizen_survival_guide"] = response.content
+        started = time.time()
+        message = build_image_message(build_government_prompt(state), state["image_ref"])
+        response = llm_scheduler.run(gemini.invoke, [message], priority=urgency_priority(state["urgencyLevel"]), label="government_analysis")
+        record_ai_usage(state, "government_analysis_ai", response, started)
+        state["government_report"] = response.content
+        state["agents_status"]["government_analysis_ai"] = "completed"
+        add_log_to_matrix(state, "✅ AI AGENT: Government Analysis - Report generated successfully", "ai_agent_government", "success")
+    except Exception as e:
+        state["government_report"] = f"Error generating government report: {str(e)}"
+        state["agents_status"]["government_analysis_ai"] = "failed"
+        add_log_to_matrix(state, f"❌ AI AGENT: Government Analysis - Failed: {str(e)}", "ai_agent_government", "error")
+    
+    return state
+
+def stream_citizen_guide(messages: list, guide_stream=None):
+    """Stream the guide from Gemini, relaying chunks to the waiting client as they arrive"""
+    parts = []
+    last_chunk = None
+    first_token_time = None
+    for chunk in gemini.stream(messages):
+        text = chunk.content if isinstance(chunk.content, str) else ""
+        last_chunk = chunk
+        if not text:
+            continue
+        if first_token_time is None:
+            first_token_time = time.time()
+        parts.append(text)
+        if guide_stream is not None:
+            guide_stream.publish("guide", {"text": text})
+    return "".join(parts), last_chunk, first_token_time
+
+def citizen_survival_ai_agent(state: EmergencyState) -> EmergencyState:
+    """AI Agent: Citizen Survival Guide using Gemini AI"""
+    add_log_to_matrix(state, "🤖 AI AGENT: Citizen Survival - Generating survival guide using Gemini AI...", "ai_agent_citizen", "info")
+    
+    if not state.get("analysis_ready", False):
+        add_log_to_matrix(state, "❌ AI AGENT: Citizen Survival - Cannot proceed: insufficient data", "ai_agent_citizen", "error")
+        state["citizen_survival_guide"] = "Error: Insufficient data for guidance"
+        state["agents_status"]["citizen_survival_ai"] = "failed"
+        return state
+
+    try:
+        started = time.time()
+        message = build_image_message(build_citizen_prompt(state), state["image_ref"])
+        guide, last_chunk, first_token_time = llm_scheduler.run(
+            stream_citizen_guide, [message], get_stream(state["disaster_id"]),
+            priority=urgency_priority(state["urgencyLevel"]), label="citizen_survival"
+        )
+        record_ai_usage(state, "citizen_survival_ai", last_chunk, started)
+        state["citizen_guide_timing"] = {
+            "time_to_first_token": round(first_token_time - started, 3) if first_token_time else None,
+            "total_time": round(time.time() - started, 3),
+            "source": "generated"
+        }
+        state["citizen_survival_guide"] = guide
+        if state.get("guide_cache_key"):
+            guide_cache.put(state["guide_cache_key"], guide, state["citizen_guide_timing"]["total_time"], state["disaster_id"])
         state["agents_status"]["citizen_survival_ai"] = "completed"
-        add_log_to_matrix(state, "✅ AI AGENT: Citizen Survival - Guide generated successfully", "ai_agent_citizen", "success")
+        add_log_to_matrix(state, f"✅ AI AGENT: Citizen Survival - Guide generated successfully (first token {state['citizen_guide_timing']['time_to_first_token']}s, total {state['citizen_guide_timing']['total_time']}s)", "ai_agent_citizen", "success")
     except Exception as e:
         state["citizen_survival_guide"] = f"Error generating citizen guide: {str(e)}"
         state["agents_status"]["citizen_survival_ai"] = "failed"
@@ -408,6 +558,107 @@ def citizen_survival_ai_agent(state: EmergencyState) -> EmergencyState:
     
     return state
 
+def build_personalize_prompt(state: EmergencyState, guide: str) -> str:
+    """Text-only prompt adapting a cached area guide to one reporter"""
+    return f"""
+    Below is a survival guide already written for a {state['emergencyType']} in this area.
+    Adapt it for this reporter without changing its structure or safety advice:
+    - Situation Description: {state['situation']}
+    - Urgency Level: {state['urgencyLevel']}
+    - Number of People with You: {state['peopleCount']}
+
+    Only adjust what these details change (group size, injuries or hazards they mention).
+    Reply with the full adapted guide only.
+
+    GUIDE:
+    {guide}
+    """
+
+def cached_citizen_guide_agent(state: EmergencyState, cached_guide: dict) -> EmergencyState:
+    """AI Agent: Citizen Survival Guide reused from an earlier report of the same area"""
+    add_log_to_matrix(state, f"♻️ AI AGENT: Citizen Survival - Reusing the guide of {cached_guide['disaster_id']} (same area, emergency type, image class and weather)", "ai_agent_citizen", "info")
+
+    started = time.time()
+    guide_stream = get_stream(state["disaster_id"])
+    guide, first_token_time, personalized = cached_guide["guide"], None, False
+    if GUIDE_PERSONALIZE:
+        try:
+            guide, last_chunk, first_token_time = llm_scheduler.run(
+                stream_citizen_guide, [HumanMessage(content=build_personalize_prompt(state, cached_guide["guide"]))], guide_stream,
+                priority=urgency_priority(state["urgencyLevel"]), label="citizen_personalize"
+            )
+            record_ai_usage(state, "citizen_personalize_ai", last_chunk, started)
+            personalized = bool(guide)
+        except Exception as e:
+            add_log_to_matrix(state, f"⚠️ AI AGENT: Citizen Survival - Personalisation failed ({str(e)}), serving the cached guide as is", "ai_agent_citizen", "warning")
+        if not personalized:
+            guide, first_token_time = cached_guide["guide"], None
+    if not personalized and guide_stream is not None:
+        guide_stream.publish("guide", {"text": guide})
+
+    total_time = round(time.time() - started, 3)
+    guide_cache.record_reuse(cached_guide, total_time, personalized)
+    print(f"Guide cache hit for {state['guide_cache_key']}: {guide_cache.get_stats()}")
+    state["citizen_guide_timing"] = {
+        "time_to_first_token": round(first_token_time - started, 3) if first_token_time else total_time,
+        "total_time": total_time,
+        "source": "personalized" if personalized else "cached",
+        "reused_from": cached_guide["disaster_id"]
+    }
+    state["citizen_survival_guide"] = guide
+    state["agents_status"]["citizen_survival_ai"] = "completed"
+    add_log_to_matrix(state, f"✅ AI AGENT: Citizen Survival - {state['citizen_guide_timing']['source'].capitalize()} guide served in {total_time}s (generation took {cached_guide['latency']}s)", "ai_agent_citizen", "success")
+    return state
+
+def parse_combined_analysis(text: str) -> dict:
+    """Parse the combined JSON reply into its two sections, raising ValueError if unusable"""
+    data = parse_reply(text, "combined_analysis")
+    government_report = str(data.get("government_report", "")).strip()
+    citizen_survival_guide = str(data.get("citizen_survival_guide", "")).strip()
+    if not government_report or not citizen_survival_guide:
+        raise ValueError("Combined response is missing a section")
+    return {"government_report": government_report, "citizen_survival_guide": citizen_survival_guide}
+
+def combined_analysis_ai_agent(state: EmergencyState) -> EmergencyState:
+    """AI Agent: Government report and citizen guide from a single multimodal Gemini call"""
+    add_log_to_matrix(state, "🤖 AI AGENT: Combined Analysis - Generating government report and survival guide in one Gemini call...", "ai_agent_combined", "info")
+
+    combined_prompt = f"""
+    You must write TWO separate documents about the same emergency, using the image and the data below.
+
+    === DOCUMENT 1: government_report ===
+    {build_government_prompt(state)}
+
+    === DOCUMENT 2: citizen_survival_guide ===
+    {build_citizen_prompt(state)}
+
+    Respond ONLY with valid JSON of the form:
+    {{
+        "government_report": "full text of document 1",
+        "citizen_survival_guide": "full text of document 2"
+    }}
+    """
+
+    started = time.time()
+    message = build_image_message(combined_prompt, state["image_ref"])
+    response = llm_scheduler.run(gemini.invoke, [message], priority=urgency_priority(state["urgencyLevel"]), label="combined_analysis")
+    record_ai_usage(state, "combined_analysis_ai", response, started)
+    sections = parse_combined_analysis(response.content)
+    # No streaming in combined mode: the guide reaches the client in one piece
+    total_time = round(time.time() - started, 3)
+    state["citizen_guide_timing"] = {"time_to_first_token": total_time, "total_time": total_time, "source": "generated"}
+    # Not cached: document 1 hands Gemini the exact report position, which the guide may repeat
+    guide_stream = get_stream(state["disaster_id"])
+    if guide_stream is not None:
+        guide_stream.publish("guide", {"text": sections["citizen_survival_guide"]})
+
+    state["government_report"] = sections["government_report"]
+    state["citizen_survival_guide"] = sections["citizen_survival_guide"]
+    state["agents_status"]["government_analysis_ai"] = "completed"
+    state["agents_status"]["citizen_survival_ai"] = "completed"
+    add_log_to_matrix(state, "✅ AI AGENT: Combined Analysis - Both documents generated successfully", "ai_agent_combined", "success")
+    return state
+
 # === DATA COLLECTION TOOLS (Non-AI components) ===
 
 def computer_vision_analysis_tool(state: EmergencyState) -> EmergencyState:
@@ -415,8 +666,8 @@ def computer_vision_analysis_tool(state: EmergencyState) -> EmergencyState:
     add_log_to_matrix(state, "🔧 DATA TOOL: Computer Vision - Processing image with CNN/YOLO models...", "data_tool_computer_vision", "info")
     
     try:
-        image_bytes = state["image_bytes"]
-        cnn_result = analyze_image_with_summary(BytesIO(image_bytes), disaster_model, yolo_model, device)
+        with track("model", "cnn_yolo"):
+            cnn_result = analyze_image_with_summary(artifact_store.open_stream(state["image_ref"]), disaster_model, yolo_model, device)
         state["cnn_result"] = cnn_result
         state["agents_status"]["computer_vision_tool"] = "completed"
         add_log_to_matrix(state, f"✅ DATA TOOL: Computer Vision - Analysis completed: {cnn_result[:100]}...", "data_tool_computer_vision", "success")
@@ -426,6 +677,39 @@ def computer_vision_analysis_tool(state: EmergencyState) -> EmergencyState:
     
     return state
 
+def fetch_weather(lat, lon) -> dict:
+    """7-day Open-Meteo forecast for a point"""
+    response = http_client.get(
+        f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current_weather=true&hourly=temperature_2m,precipitation,wind_speed_10m&daily=temperature_2m_max,temperature_2m_min,precipitation_sum&forecast_days=7"
+    )
+    return response.json()
+
+def fetch_gdacs_feed() -> bytes:
+    """The global GDACS RSS feed (filtered per location by build_gdac_data)"""
+    response = http_client.get(
+        "https://www.gdacs.org/xml/rss.xml",
+        headers={
+            'User-Agent': 'Emergency Response System/1.0'
+        }
+    )
+    response.raise_for_status()
+    return response.content
+
+def build_gdac_data(rss_content, lat: float, lon: float, radius_km: float = GDACS_RADIUS_KM) -> dict:
+    """GDACS events of the feed within radius_km of the point"""
+    nearby_disasters = parse_gdacs_rss_feed(rss_content, lat, lon, radius_km)
+    return {
+        "search_location": {
+            "latitude": lat,
+            "longitude": lon,
+            "search_radius_km": radius_km
+        },
+        "nearby_disasters": nearby_disasters,
+        "total_disasters_found": len(nearby_disasters),
+        "last_updated": datetime.now().isoformat(),
+        "data_source": "GDACS RSS Feed"
+    }
+
 def weather_data_collection_tool(state: EmergencyState) -> EmergencyState:
     """Data Collection Tool: Weather API integration"""
     add_log_to_matrix(state, "🌤️ DATA TOOL: Weather Collection - Fetching weather data from Open-Meteo API...", "data_tool_weather", "info")
@@ -433,11 +717,7 @@ def weather_data_collection_tool(state: EmergencyState) -> EmergencyState:
     lat = state["latitude"]
     lon = state["longitude"]
     try:
-        response = requests.get(
-            f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current_weather=true&hourly=temperature_2m,precipitation,wind_speed_10m&daily=temperature_2m_max,temperature_2m_min,precipitation_sum&forecast_days=7",
-            timeout=10
-        )
-        state["weather"] = response.json()
+        state["weather"] = fetch_weather(lat, lon)
         state["agents_status"]["weather_data_tool"] = "completed"
         add_log_to_matrix(state, "✅ DATA TOOL: Weather Collection - Weather data retrieved successfully", "data_tool_weather", "success")
     except Exception as e:
@@ -452,39 +732,12 @@ def disaster_history_collection_tool(state: EmergencyState) -> EmergencyState:
     
     lat = float(state["latitude"])
     lon = float(state["longitude"])
-    radius_km = 20  # Search within 20km radius
+    radius_km = GDACS_RADIUS_KM
     
     try:
-        # Fetch GDACS RSS feed
-        response = requests.get(
-            "https://www.gdacs.org/xml/rss.xml",
-            timeout=15,
-            headers={
-                'User-Agent': 'Emergency Response System/1.0'
-            }
-        )
-        response.raise_for_status()
-        
-        # Parse RSS feed and filter by location
-        nearby_disasters = parse_gdacs_rss_feed(
-            response.content, 
-            lat, 
-            lon, 
-            radius_km
-        )
-        
-        # Structure the response
-        gdac_data = {
-            "search_location": {
-                "latitude": lat,
-                "longitude": lon,
-                "search_radius_km": radius_km
-            },
-            "nearby_disasters": nearby_disasters,
-            "total_disasters_found": len(nearby_disasters),
-            "last_updated": datetime.now().isoformat(),
-            "data_source": "GDACS RSS Feed"
-        }
+        # Fetch GDACS RSS feed and filter by location
+        gdac_data = build_gdac_data(fetch_gdacs_feed(), lat, lon, radius_km)
+        nearby_disasters = gdac_data["nearby_disasters"]
         
         state["gdac_disasters"] = gdac_data
         state["agents_status"]["disaster_history_tool"] = "completed"
@@ -544,9 +797,9 @@ def parallel_data_collection_coordinator(state: EmergencyState) -> EmergencyStat
     # Run all three data collection tools in parallel using threading
     with ThreadPoolExecutor(max_workers=3) as executor:
         # Submit all three tasks
-        cv_future = executor.submit(computer_vision_analysis_tool, state.copy())
-        weather_future = executor.submit(weather_data_collection_tool, state.copy())
-        disaster_future = executor.submit(disaster_history_collection_tool, state.copy())
+        cv_future = submit_with_context(executor, computer_vision_analysis_tool, state.copy())
+        weather_future = submit_with_context(executor, weather_data_collection_tool, state.copy())
+        disaster_future = submit_with_context(executor, disaster_history_collection_tool, state.copy())
         
         # Wait for all to complete and merge results
         cv_result = cv_future.result()
@@ -560,17 +813,12 @@ def parallel_data_collection_coordinator(state: EmergencyState) -> EmergencyStat
         state["agents_status"]["computer_vision_tool"] = cv_result["agents_status"]["computer_vision_tool"]
         state["agents_status"]["weather_data_tool"] = weather_result["agents_status"]["weather_data_tool"]
         state["agents_status"]["disaster_history_tool"] = disaster_result["agents_status"]["disaster_history_tool"]
-        
-        # Merge logs from parallel tasks
-        if "ai_matrix_logs" in cv_result:
-            state["ai_matrix_logs"].extend(cv_result["ai_matrix_logs"])
-        if "ai_matrix_logs" in weather_result:
-            state["ai_matrix_logs"].extend(weather_result["ai_matrix_logs"])
-        if "ai_matrix_logs" in disaster_result:
-            state["ai_matrix_logs"].extend(disaster_result["ai_matrix_logs"])
+        # Logs need no merge: the workers wrote to the shared collector
     
     state["parallel_tasks_completed"] = True
     add_log_to_matrix(state, "✅ SYSTEM COORDINATOR: Data Collection - All data collection tasks completed", "system_coordinator_data", "success")
+    for host, host_stats in http_client.get_http_stats().items():
+        add_log_to_matrix(state, f"   🌐 {host}: {host_stats['requests']} requests, {host_stats['connections_reused']} reused connections, avg {host_stats['avg_latency_ms']}ms", "system_coordinator_data", "info")
     return state
 
 def data_validation_coordinator(state: EmergencyState) -> EmergencyState:
@@ -593,6 +841,28 @@ def data_validation_coordinator(state: EmergencyState) -> EmergencyState:
     
     return state
 
+def context_summary_coordinator(state: EmergencyState) -> EmergencyState:
+    """System Coordinator: Reduce weather and GDACS payloads to compact prompt features"""
+    try:
+        state["weather_summary"] = summarize_weather(state.get("weather", {}))
+        state["gdac_summary"] = summarize_gdacs(state.get("gdac_disasters", {}))
+    except Exception as e:
+        # Empty summaries make the agents prompt with the raw payloads instead
+        state["weather_summary"], state["gdac_summary"] = {}, {}
+        state["prompt_context"] = {"mode": "raw", "summary_error": str(e)}
+        add_log_to_matrix(state, f"⚠️ SYSTEM COORDINATOR: Context Summary - Failed ({str(e)}), using raw weather/GDACS context", "system_coordinator_context", "warning")
+        return state
+
+    raw_tokens = estimate_tokens(str(state['weather']) + str(state['gdac_disasters']))
+    compact_tokens = estimate_tokens(compact_json(state["weather_summary"]) + compact_json(state["gdac_summary"]))
+    state["prompt_context"] = {
+        "mode": PROMPT_CONTEXT_MODE,
+        "raw_context_tokens_est": raw_tokens,
+        "compact_context_tokens_est": compact_tokens
+    }
+    add_log_to_matrix(state, f"🧮 SYSTEM COORDINATOR: Context Summary - Weather/GDACS context ~{raw_tokens} tokens raw, ~{compact_tokens} tokens compact (using {PROMPT_CONTEXT_MODE})", "system_coordinator_context", "info")
+    return state
+
 def parallel_ai_analysis_coordinator(state: EmergencyState) -> EmergencyState:
     """System Coordinator: Parallel execution of AI analysis agents"""
     add_log_to_matrix(state, "🔄 SYSTEM COORDINATOR: AI Analysis - Starting parallel AI agent analysis...", "system_coordinator_ai_analysis", "info")
@@ -600,12 +870,28 @@ def parallel_ai_analysis_coordinator(state: EmergencyState) -> EmergencyState:
     if not state.get("analysis_ready", False):
         add_log_to_matrix(state, "❌ SYSTEM COORDINATOR: AI Analysis - Cannot proceed: data validation failed", "system_coordinator_ai_analysis", "error")
         return state
+
+    analysis_start_time = time.time()
+    state["guide_cache_key"] = guide_key(state["emergencyType"], state["latitude"], state["longitude"], state["cnn_result"], state.get("weather_summary"), state["peopleCount"])
+    cached_guide = guide_cache.get(state["guide_cache_key"])
+
+    # With a cached guide only the government report needs the multimodal call, so combined mode has nothing to merge
+    if AI_ANALYSIS_MODE == "combined" and cached_guide is None:
+        try:
+            combined_analysis_ai_agent(state)
+            add_log_to_matrix(state, f"✅ SYSTEM COORDINATOR: AI Analysis - Combined generation completed in {time.time() - analysis_start_time:.2f}s", "system_coordinator_ai_analysis", "success")
+            return state
+        except Exception as e:
+            add_log_to_matrix(state, f"⚠️ SYSTEM COORDINATOR: AI Analysis - Combined generation failed ({str(e)}), falling back to separate agents", "system_coordinator_ai_analysis", "warning")
     
     # Run both AI analysis agents in parallel using threading
     with ThreadPoolExecutor(max_workers=2) as executor:
         # Submit both AI agent tasks
-        gov_future = executor.submit(government_analysis_ai_agent, state.copy())
-        citizen_future = executor.submit(citizen_survival_ai_agent, state.copy())
+        gov_future = submit_with_context(executor, government_analysis_ai_agent, state.copy())
+        if cached_guide is None:
+            citizen_future = submit_with_context(executor, citizen_survival_ai_agent, state.copy())
+        else:
+            citizen_future = submit_with_context(executor, cached_citizen_guide_agent, state.copy(), cached_guide)
         
         # Wait for both to complete and merge results
         gov_result = gov_future.result()
@@ -616,14 +902,12 @@ def parallel_ai_analysis_coordinator(state: EmergencyState) -> EmergencyState:
         state["citizen_survival_guide"] = citizen_result["citizen_survival_guide"]
         state["agents_status"]["government_analysis_ai"] = gov_result["agents_status"]["government_analysis_ai"]
         state["agents_status"]["citizen_survival_ai"] = citizen_result["agents_status"]["citizen_survival_ai"]
-        
-        # Merge logs from parallel tasks
-        if "ai_matrix_logs" in gov_result:
-            state["ai_matrix_logs"].extend(gov_result["ai_matrix_logs"])
-        if "ai_matrix_logs" in citizen_result:
-            state["ai_matrix_logs"].extend(citizen_result["ai_matrix_logs"])
+        state["ai_usage"].update(gov_result["ai_usage"])
+        state["ai_usage"].update(citizen_result["ai_usage"])
+        state["citizen_guide_timing"] = citizen_result.get("citizen_guide_timing", {})
+        # Logs need no merge: the workers wrote to the shared collector
     
-    add_log_to_matrix(state, "✅ SYSTEM COORDINATOR: AI Analysis - All AI agent analysis tasks completed", "system_coordinator_ai_analysis", "success")
+    add_log_to_matrix(state, f"✅ SYSTEM COORDINATOR: AI Analysis - All AI agent analysis tasks completed in {time.time() - analysis_start_time:.2f}s", "system_coordinator_ai_analysis", "success")
     return state
 
 def final_system_coordinator(state: EmergencyState) -> EmergencyState:
@@ -667,8 +951,12 @@ def final_system_coordinator(state: EmergencyState) -> EmergencyState:
     
     return state
 
-def create_multiagent_emergency_graph():
-    """Create the multiagent emergency response graph with clear AI/Tool distinction"""
+def create_multiagent_emergency_graph(collect_data: bool = True):
+    """Create the multiagent emergency response graph with clear AI/Tool distinction.
+
+    collect_data=False starts at data validation, for callers that fill cnn_result,
+    weather and gdac_disasters themselves (batch ingestion).
+    """
     print("🏗️ Creating Multiagent Emergency Response System...")
     print("🤖 AI Agents: Government Analysis, Citizen Survival")
     print("🔧 Data Tools: Computer Vision Analysis, Weather Collection, Disaster History Collection")
@@ -677,23 +965,66 @@ def create_multiagent_emergency_graph():
     graph = StateGraph(EmergencyState)
     
     # Add coordinators only (tools and AI agents are called within coordinators)
-    graph.add_node("parallel_data_collection", parallel_data_collection_coordinator)
-    graph.add_node("data_validation", data_validation_coordinator)
-    graph.add_node("parallel_ai_analysis", parallel_ai_analysis_coordinator)
-    graph.add_node("final_coordinator", final_system_coordinator)
+    if collect_data:
+        graph.add_node("parallel_data_collection", instrumented("emergency_graph", "parallel_data_collection")(parallel_data_collection_coordinator))
+    graph.add_node("data_validation", instrumented("emergency_graph", "data_validation")(data_validation_coordinator))
+    graph.add_node("context_summary", instrumented("emergency_graph", "context_summary")(context_summary_coordinator))
+    graph.add_node("parallel_ai_analysis", instrumented("emergency_graph", "parallel_ai_analysis")(parallel_ai_analysis_coordinator))
+    graph.add_node("final_coordinator", instrumented("emergency_graph", "final_coordinator")(final_system_coordinator))
 
     # Set up the workflow
-    graph.set_entry_point("parallel_data_collection")
-    graph.add_edge("parallel_data_collection", "data_validation")
-    graph.add_edge("data_validation", "parallel_ai_analysis")
+    if collect_data:
+        graph.set_entry_point("parallel_data_collection")
+        graph.add_edge("parallel_data_collection", "data_validation")
+    else:
+        graph.set_entry_point("data_validation")
+    graph.add_edge("data_validation", "context_summary")
+    graph.add_edge("context_summary", "parallel_ai_analysis")
     graph.add_edge("parallel_ai_analysis", "final_coordinator")
     graph.set_finish_point("final_coordinator")
 
     print("✅ Multiagent Emergency Response System created successfully!")
     return graph.compile()
 
+def build_initial_state(disaster_id, image_ref, image_phash, emergencyType, urgencyLevel, situation, peopleCount,
+                        latitude, longitude, user_id, submitted_time, ai_processing_start_time) -> EmergencyState:
+    """Fresh graph state of one report"""
+    return {
+        "disaster_id": disaster_id,
+        "image_ref": image_ref,
+        "image_phash": image_phash,
+        "emergencyType": emergencyType,
+        "urgencyLevel": urgencyLevel,
+        "situation": situation,
+        "peopleCount": peopleCount,
+        "latitude": latitude,
+        "longitude": longitude,
+        "cnn_result": "",
+        "weather": {},
+        "gdac_disasters": {},
+        "weather_summary": {},
+        "gdac_summary": {},
+        "prompt_context": {},
+        "government_report": "",
+        "citizen_survival_guide": "",
+        "user_id": user_id,
+        "submitted_time": submitted_time,
+        "ai_processing_start_time": ai_processing_start_time,
+        "ai_processing_end_time": 0,
+        "status": "pending",
+        "image_url": "",
+        "agents_status": {},
+        "parallel_tasks_completed": False,
+        "analysis_ready": False,
+        "ai_matrix_logs": MatrixLogCollector(),
+        "ai_usage": {},
+        "citizen_guide_timing": {},
+        "guide_cache_key": ()
+    }
+
 # Create the multiagent graph
 multiagent_graph = create_multiagent_emergency_graph()
+analysis_graph = create_multiagent_emergency_graph(collect_data=False)
 
 async def handle_emergency_report(
     emergencyType,
@@ -703,7 +1034,8 @@ async def handle_emergency_report(
     latitude,
     longitude,
     image,
-    user
+    user,
+    guide_stream=None
 ):
     """Main handler for emergency reports using multiagent system"""
     print("🚨 MULTIAGENT EMERGENCY RESPONSE SYSTEM ACTIVATED 🚨")
@@ -718,38 +1050,54 @@ async def handle_emergency_report(
     
     # Generate unique disaster ID
     disaster_id = generate_geohash_date_uuid(latitude, longitude)
+    start_trace(disaster_id)
     print(f"📋 Generated Disaster ID: {disaster_id}")
+
+    image_bytes = image if isinstance(image, bytes) else await image.read()
+
+    # Cheap dedup before the CNN / weather / GDACS / Gemini pipeline
+    image_phash = ""
+    if REPORT_DEDUP_ENABLED:
+        duplicate = None
+        try:
+            image_phash = await asyncio.to_thread(image_dhash, image_bytes)
+            duplicate = await asyncio.to_thread(
+                report_deduplicator.find_duplicate, emergencyType, latitude, longitude, image_phash, urgencyLevel, peopleCount
+            )
+        except Exception as e:
+            print(f"Report dedup skipped: {str(e)}")
+        if duplicate is not None:
+            report = {
+                'emergency_type': emergencyType,
+                'urgency_level': urgencyLevel,
+                'situation': situation,
+                'people_count': peopleCount,
+                'latitude': float(latitude),
+                'longitude': float(longitude),
+                'image_phash': image_phash,
+                'user_id': getattr(user, 'uid', 'anonymous'),
+                'submitted_time': submitted_time
+            }
+            corroboration = await attach_corroborating_report(duplicate, disaster_id, report, image_bytes, guide_stream)
+            if corroboration is not None:
+                report_deduplicator.record_outcome(True)
+                return corroboration
+        report_deduplicator.record_outcome(False)
+
+    if guide_stream is not None:
+        register_stream(disaster_id, guide_stream)
+        guide_stream.publish("report", {"disaster_id": disaster_id})
     
-    image_bytes = await image.read()
-    
-    # Upload image to Firebase Storage
-    print("📤 Uploading image to Firebase Storage...")
-    image_url = upload_image_to_firebase_storage(image_bytes, disaster_id)
+    # Upload image to Firebase Storage in the background while the analysis runs
+    print("📤 Uploading image to Firebase Storage (in background)...")
+    upload_start_time = time.time()
+    upload_future = submit_with_context(upload_executor, upload_image_to_firebase_storage, image_bytes, disaster_id)
+    image_ref = artifact_store.put(image_bytes)
 
-    initial_state: EmergencyState = {
-        "image_bytes": image_bytes,
-        "emergencyType": emergencyType,
-        "urgencyLevel": urgencyLevel,
-        "situation": situation,
-        "peopleCount": peopleCount,
-        "latitude": latitude,
-        "longitude": longitude,
-        "cnn_result": "",
-        "weather": {},
-        "gdac_disasters": {},
-        "government_report": "",
-        "citizen_survival_guide": "",
-        "user_id": getattr(user, 'uid', 'anonymous'),
-        "submitted_time": submitted_time,
-        "ai_processing_start_time": ai_processing_start_time,
-        "ai_processing_end_time": 0,
-        "status": "pending",
-        "image_url": image_url,
-        "agents_status": {},
-        "parallel_tasks_completed": False,
-        "analysis_ready": False,
-        "ai_matrix_logs": []  
-    }
+    initial_state = build_initial_state(
+        disaster_id, image_ref, image_phash, emergencyType, urgencyLevel, situation, peopleCount,
+        latitude, longitude, getattr(user, 'uid', 'anonymous'), submitted_time, ai_processing_start_time
+    )
 
     # Add initial log entry
     add_log_to_matrix(initial_state, "🚨 MULTIAGENT EMERGENCY RESPONSE SYSTEM ACTIVATED 🚨", "system", "info")
@@ -758,8 +1106,13 @@ async def handle_emergency_report(
     add_log_to_matrix(initial_state, f"📋 Generated Disaster ID: {disaster_id}", "system", "info")
     add_log_to_matrix(initial_state, "⚙️ Starting Multiagent Processing Pipeline...", "system", "info")
     
-    # Process with multiagent system
-    final_state = multiagent_graph.invoke(initial_state)
+    # Process with multiagent system (off the event loop so streamed chunks can be relayed)
+    try:
+        final_state = await asyncio.to_thread(multiagent_graph.invoke, initial_state)
+    finally:
+        unregister_stream(disaster_id)
+        artifact_stats = artifact_store.get_stats()
+        artifact_store.release(image_ref)
     
     # Record AI processing end time
     ai_processing_end_time = time.time()
@@ -769,25 +1122,27 @@ async def handle_emergency_report(
     processing_time = ai_processing_end_time - ai_processing_start_time
     
     add_log_to_matrix(final_state, f"⏱️ Total Processing Time: {processing_time:.2f} seconds", "system", "info")
+    add_log_to_matrix(final_state, f"🧠 Artifact store: {artifact_stats['bytes_held'] / 1e6:.2f} MB held across {artifact_stats['artifacts']} in-flight reports (peak {artifact_stats['peak_bytes_held'] / 1e6:.2f} MB)", "system", "info")
+
+    # Wait for the background upload so the saved record carries the image URL
+    image_url = await asyncio.wrap_future(upload_future)
+    final_state["image_url"] = image_url
+    upload_wait_time = time.time() - ai_processing_end_time
+    add_log_to_matrix(final_state, f"📤 Image upload finished {time.time() - upload_start_time:.2f}s after start (waited {upload_wait_time:.2f}s after analysis)", "system", "info" if image_url else "error")
     
-    # Save to Firebase Realtime Database
-    add_log_to_matrix(final_state, "💾 Saving to Firebase Realtime Database...", "system", "info")
-    save_success = save_to_realtime_database(final_state, disaster_id, processing_time)
+    # Save disaster record, AI matrix and index entry in one multi-path update
+    add_log_to_matrix(final_state, "💾 Saving disaster report and AI Matrix to Firebase Realtime Database...", "system", "info")
+    save_success = save_report_records(final_state, disaster_id, processing_time)
+    report_deduplicator.record_pipeline(processing_time)
     
     if not save_success:
-        add_log_to_matrix(final_state, "❌ Failed to save disaster report to database", "system", "error")
+        print("❌ Failed to save disaster report to database")
         return {"error": "Failed to save disaster report to database"}
 
-    # Save AI Matrix logs to database
-    add_log_to_matrix(final_state, "💾 Saving AI Matrix logs to database...", "system", "info")
-    ai_matrix_success = save_ai_matrix_to_database(final_state, disaster_id)
-    
-    if ai_matrix_success:
-        add_log_to_matrix(final_state, "✅ AI Matrix logs saved successfully", "system", "success")
-    else:
-        add_log_to_matrix(final_state, "❌ Failed to save AI Matrix logs", "system", "error")
-
     add_log_to_matrix(final_state, "🎉 MULTIAGENT EMERGENCY RESPONSE COMPLETED SUCCESSFULLY!", "system", "success")
+
+    # Draft the first task now so accepting the disaster is a single write
+    schedule_first_task_draft(disaster_id)
     
     return {
         "disaster_id": disaster_id,
@@ -797,5 +1152,5 @@ async def handle_emergency_report(
         "image_url": image_url,
         "status": final_state["status"],
         "agents_status": final_state["agents_status"],  
-        "ai_matrix_saved": ai_matrix_success  
+        "ai_matrix_saved": save_success  
     }
\ No newline at end of file
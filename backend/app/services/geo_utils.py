@@ -0,0 +1,42 @@
+import heapq
+import math
+
+import geohash
+
+# Precision stored on resources (~1.2 km x 0.6 km cells); lookups search coarser prefixes
+RESOURCE_GEOHASH_PRECISION = 6
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    """Great-circle distance between two points in kilometers"""
+    lat1, lon1, lat2, lon2 = map(math.radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def encode(latitude, longitude, precision: int = RESOURCE_GEOHASH_PRECISION) -> str:
+    return geohash.encode(float(latitude), float(longitude), precision=precision)
+
+
+def cells_around(latitude, longitude, precision: int) -> list:
+    """Geohash cell containing the point plus its 8 neighbours"""
+    center = encode(latitude, longitude, precision)
+    return [center] + geohash.neighbors(center)
+
+
+def nearest_k(items, latitude, longitude, k: int) -> list:
+    """Top-k items by great-circle distance using a bounded heap.
+
+    Returns copies of the selected items with `distance_km` added; inputs are not modified.
+    """
+    def distances():
+        for index, item in enumerate(items):
+            try:
+                yield haversine_km(latitude, longitude, item["latitude"], item["longitude"]), index, item
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    return [{**item, "distance_km": distance} for distance, _, item in heapq.nsmallest(k, distances())]
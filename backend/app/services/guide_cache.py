@@ -0,0 +1,123 @@
+import os
+import re
+import threading
+
+import pygeohash as pgh
+from cachetools import TTLCache
+
+from app.services.metrics import CITIZEN_GUIDES
+
+GUIDE_CACHE_TTL_SECONDS = int(os.getenv("GUIDE_CACHE_TTL_SECONDS", "1800"))
+# Precision 5 cells are ~5 km across: reports of one flood in one town share a guide
+GUIDE_CACHE_PRECISION = int(os.getenv("GUIDE_CACHE_PRECISION", "5"))
+# "true": cached guides get a cheap text-only Gemini call adapting them to the reporter
+GUIDE_PERSONALIZE = os.getenv("GUIDE_PERSONALIZE", "false").lower() == "true"
+
+HEAVY_RAIN_HOURS = 1
+STRONG_WIND_HOURS = 1
+HOT_C = 35
+COLD_C = 5
+# Upper bounds of the group sizes that share a guide (a family is advised differently than a shelter)
+PEOPLE_BUCKETS = ((1, "1"), (5, "2-5"), (20, "6-20"), (100, "21-100"))
+
+_CNN_CLASS_RE = re.compile(r"shows an? (\w+) scene", re.IGNORECASE)
+
+
+def cnn_class(cnn_result: str) -> str:
+    """Predicted class from the analyze_image_with_summary sentence"""
+    match = _CNN_CLASS_RE.search(str(cnn_result or ""))
+    return match.group(1).lower() if match else "unknown"
+
+
+def weather_bucket(weather_summary: dict) -> str:
+    """Coarse weather state from context_summary.summarize_weather (guides only differ at this level)"""
+    if not weather_summary or "error" in weather_summary:
+        return "unknown"
+    next_24h = weather_summary.get("next_24h", {})
+    temperature = weather_summary.get("current", {}).get("temperature_c")
+    parts = [
+        "rain" if next_24h.get("heavy_rain_hours", 0) >= HEAVY_RAIN_HOURS else "dry",
+        "wind" if next_24h.get("strong_wind_hours", 0) >= STRONG_WIND_HOURS else "calm",
+    ]
+    if temperature is not None:
+        parts.append("hot" if temperature >= HOT_C else "cold" if temperature <= COLD_C else "mild")
+    return "-".join(parts)
+
+
+def people_bucket(people_count) -> str:
+    """Group-size class of the reported people count; free text like "many" stays unknown"""
+    try:
+        count = int(str(people_count).strip())
+    except ValueError:
+        return "unknown"
+    for upper, label in PEOPLE_BUCKETS:
+        if count <= upper:
+            return label
+    return "100+"
+
+
+def guide_area(latitude, longitude) -> tuple:
+    """Centre of the reporter's cache cell: guides are shared per cell, so they never name an exact position"""
+    center_lat, center_lon = pgh.decode(pgh.encode(float(latitude), float(longitude), precision=GUIDE_CACHE_PRECISION))
+    return round(center_lat, 3), round(center_lon, 3)
+
+
+def guide_key(emergency_type, latitude, longitude, cnn_result, weather_summary, people_count) -> tuple:
+    return (
+        str(emergency_type).strip().lower(),
+        pgh.encode(float(latitude), float(longitude), precision=GUIDE_CACHE_PRECISION),
+        cnn_class(cnn_result),
+        weather_bucket(weather_summary),
+        people_bucket(people_count),
+    )
+
+
+class GuideCache:
+    """TTL cache of citizen survival guides per (emergency type, geohash cell, CNN class, weather, group size).
+
+    The first report of an area pays for the multimodal Gemini call; later reports in
+    the window reuse its guide. Entries live in this process only.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: int = GUIDE_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "personalized": 0, "latency_saved_seconds": 0.0}
+
+    def get(self, key: tuple):
+        """Cached entry {"guide", "latency", "disaster_id"} (a copy) or None"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                CITIZEN_GUIDES.labels("generated").inc()
+                return None
+            self._stats["hits"] += 1
+            return dict(entry)
+
+    def put(self, key: tuple, guide: str, latency: float, disaster_id: str):
+        if not guide or guide.startswith("Error"):
+            return
+        with self._lock:
+            self._cache[key] = {"guide": guide, "latency": latency, "disaster_id": disaster_id}
+
+    def record_reuse(self, entry: dict, elapsed: float, personalized: bool):
+        """Count a served cached guide; `elapsed` is what serving it cost instead of `entry["latency"]`"""
+        CITIZEN_GUIDES.labels("personalized" if personalized else "cached").inc()
+        with self._lock:
+            if personalized:
+                self._stats["personalized"] += 1
+            self._stats["latency_saved_seconds"] += max(0.0, entry["latency"] - elapsed)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._cache)
+        # Personalised hits still save the multimodal call, they only add a text-only one
+        stats["multimodal_calls_saved"] = stats["hits"]
+        stats["hit_rate"] = round(stats["hits"] / (stats["hits"] + stats["misses"]), 4) if stats["hits"] + stats["misses"] else 0.0
+        stats["latency_saved_seconds"] = round(stats["latency_saved_seconds"], 3)
+        return stats
+
+
+guide_cache = GuideCache()
@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+# disaster_id -> GuideStream of the request currently waiting on that report
+_streams = {}
+
+
+class GuideStream:
+    """Relay of citizen-guide chunks from the worker threads to an SSE response.
+
+    Must be created inside the event loop; `publish` may be called from any thread.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+
+    def publish(self, event: str, data):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (event, data))
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    async def events(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            yield item
+
+
+def register_stream(disaster_id: str, stream: GuideStream):
+    _streams[disaster_id] = stream
+
+
+def get_stream(disaster_id: str):
+    return _streams.get(disaster_id)
+
+
+def unregister_stream(disaster_id: str):
+    _streams.pop(disaster_id, None)
+
+
+def format_sse(event: str, data) -> str:
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,161 @@
+import contextvars
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from app.services.metrics import track
+
+# Per-host (connect, read) timeout budgets in seconds
+HOST_TIMEOUTS = {
+    "api.open-meteo.com": (3.05, 10),
+    "www.gdacs.org": (3.05, 15),
+}
+DEFAULT_TIMEOUT = (3.05, 10)
+
+POOL_MAXSIZE = 10
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_stats = {}
+_lock = threading.Lock()
+# time.monotonic() by which the current request() call must be done, retries included
+_deadline = contextvars.ContextVar("http_deadline", default=None)
+
+
+class DeadlineRetry(Retry):
+    """Retry that gives up once the deadline of the current request() call has passed"""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        deadline = _deadline.get()
+        if deadline is not None and time.monotonic() >= deadline:
+            raise MaxRetryError(_pool, url, error)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def _build_retry() -> Retry:
+    """Retry policy: jittered exponential backoff, idempotent methods only (no POST)"""
+    return DeadlineRetry(
+        total=3,
+        connect=3,
+        read=2,
+        backoff_factor=0.3,
+        backoff_jitter=0.2,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def get_session(url: str) -> requests.Session:
+    """Return the keep-alive session (own connection pool) for the host of url"""
+    host = urlsplit(url).netloc
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=_build_retry())
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+            _stats[host] = {"requests": 0, "errors": 0, "total_latency": 0.0}
+    return session
+
+
+def request(method: str, url: str, timeout=None, deadline: float = None, **kwargs) -> requests.Response:
+    """Send a request through the pooled session of the target host.
+
+    `deadline` (seconds) bounds the whole call: no retry starts after it has passed and
+    the read timeout never exceeds it (a read timeout of None then means "until the deadline").
+    """
+    host = urlsplit(url).netloc
+    session = get_session(url)
+    if timeout is None:
+        timeout = HOST_TIMEOUTS.get(host, DEFAULT_TIMEOUT)
+    if deadline is not None:
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        timeout = (connect, deadline if read is None else min(read, deadline))
+        token = _deadline.set(time.monotonic() + deadline)
+
+    start = time.perf_counter()
+    try:
+        with track("http", host):
+            return session.request(method, url, timeout=timeout, **kwargs)
+    except requests.RequestException:
+        with _lock:
+            _stats[host]["errors"] += 1
+        raise
+    finally:
+        if deadline is not None:
+            _deadline.reset(token)
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _stats[host]["requests"] += 1
+            _stats[host]["total_latency"] += elapsed
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def get_http_stats() -> dict:
+    """Connection reuse counters and average latency per host"""
+    stats = {}
+    for host, session in list(_sessions.items()):
+        opened = 0
+        served = 0
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+                    served += pool.num_requests
+
+        host_stats = _stats.get(host, {})
+        count = host_stats.get("requests", 0)
+        stats[host] = {
+            "requests": count,
+            "errors": host_stats.get("errors", 0),
+            "connections_opened": opened,
+            "connections_reused": max(served - opened, 0),
+            "avg_latency_ms": round(host_stats.get("total_latency", 0.0) / count * 1000, 2) if count else 0.0,
+        }
+    return stats
+
+
+def compare_latency(url: str, rounds: int = 5) -> dict:
+    """Time `rounds` GETs with a fresh connection each vs. the pooled keep-alive session"""
+    timeout = HOST_TIMEOUTS.get(urlsplit(url).netloc, DEFAULT_TIMEOUT)
+
+    cold = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        requests.get(url, timeout=timeout)
+        cold.append(time.perf_counter() - start)
+
+    pooled = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        get(url)
+        pooled.append(time.perf_counter() - start)
+
+    return {
+        "url": url,
+        "rounds": rounds,
+        "unpooled_avg_ms": round(sum(cold) / rounds * 1000, 2),
+        "pooled_avg_ms": round(sum(pooled) / rounds * 1000, 2),
+    }
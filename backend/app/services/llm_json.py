@@ -0,0 +1,120 @@
+import ast
+import json
+import re
+import threading
+from typing import TypedDict
+
+from app.services.metrics import LLM_JSON_REPLIES
+
+
+# Typed response schemas for Gemini JSON mode (google-generativeai accepts TypedDict classes)
+class FirstTaskReply(TypedDict):
+    description: str
+    roles: str
+    reasoning: str
+
+
+class RequestTaskReply(TypedDict):
+    description: str
+    roles: str
+    reasoning: str
+    resource_utilization: str
+
+
+class FallbackTaskReply(TypedDict):
+    description: str
+    roles: str
+
+
+def json_generation_config(schema) -> dict:
+    """generation_config asking Gemini for JSON matching `schema`"""
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+def _first_object(text: str) -> str:
+    """The first balanced {...} in the text, ignoring braces inside strings"""
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object in reply")
+    depth = 0
+    quote = None
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    raise ValueError("Unbalanced JSON object in reply")
+
+
+def parse_llm_json(text: str) -> tuple:
+    """Parse a JSON object from an LLM reply, repairing common damage locally.
+
+    Handles markdown fences, text before/after the object, trailing commas and
+    Python-style single-quoted dicts. Returns (data, repaired) and raises ValueError
+    when no object can be recovered.
+    """
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, False
+    except (TypeError, ValueError):
+        pass
+
+    candidate = _first_object(_FENCE_RE.sub("", str(text)))
+    for attempt in (candidate, _TRAILING_COMMA_RE.sub(r"\1", candidate)):
+        try:
+            data = json.loads(attempt)
+        except ValueError:
+            try:
+                # Single quotes / True / None: valid Python literal, invalid JSON
+                data = ast.literal_eval(attempt)
+            except (ValueError, SyntaxError):
+                continue
+        if isinstance(data, dict):
+            return data, True
+    raise ValueError("Unrepairable JSON in reply")
+
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def record_outcome(endpoint: str, outcome: str):
+    """outcome: 'parsed', 'repaired', 'failed' or 'retry' (a second Gemini call was needed)"""
+    LLM_JSON_REPLIES.labels(endpoint, outcome).inc()
+    with _stats_lock:
+        endpoint_stats = _stats.setdefault(endpoint, {"parsed": 0, "repaired": 0, "failed": 0, "retry": 0})
+        endpoint_stats[outcome] += 1
+
+
+def parse_reply(text: str, endpoint: str) -> dict:
+    """parse_llm_json with per-endpoint outcome tracking"""
+    try:
+        data, repaired = parse_llm_json(text)
+    except ValueError:
+        record_outcome(endpoint, "failed")
+        raise
+    record_outcome(endpoint, "repaired" if repaired else "parsed")
+    return data
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        return {endpoint: dict(endpoint_stats) for endpoint, endpoint_stats in _stats.items()}
@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from app.services.metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, track
+
+# Lower value = served first
+URGENCY_PRIORITY = {
+    "critical": 0,
+    "urgent": 0,
+    "high": 0,
+    "medium": 1,
+    "moderate": 1,
+    "low": 2,
+    "minimal": 3,
+}
+DEFAULT_PRIORITY = 1
+
+
+def urgency_priority(urgency) -> int:
+    """Map urgencyLevel / urgency_type values to a scheduler priority"""
+    return URGENCY_PRIORITY.get(str(urgency).strip().lower(), DEFAULT_PRIORITY)
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LLMScheduler:
+    """Single admission point for every Gemini call in the process.
+
+    Callers block in `run` until they are the highest-priority waiter (FIFO within a
+    priority), a concurrency slot is free and the rate limiter grants a token.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: float, burst: int):
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "rate_limited_waits": 0,
+            "by_priority": {},
+        }
+
+    def run(self, fn, *args, priority: int = DEFAULT_PRIORITY, label: str = None, **kwargs):
+        """Run fn(*args, **kwargs) once admitted and return its result"""
+        enqueued = time.monotonic()
+        ticket = (priority, next(self._seq))
+
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            LLM_QUEUE_DEPTH.set(len(self._queue))
+            self._stats["submitted"] += 1
+            self._stats["by_priority"][priority] = self._stats["by_priority"].get(priority, 0) + 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._queue))
+
+            while True:
+                if self._queue[0] == ticket and self._active < self.max_concurrency:
+                    delay = self.bucket.try_acquire()
+                    if delay == 0:
+                        break
+                    self._stats["rate_limited_waits"] += 1
+                    self._cond.wait(timeout=delay)
+                else:
+                    self._cond.wait()
+
+            heapq.heappop(self._queue)
+            LLM_QUEUE_DEPTH.set(len(self._queue))
+            self._active += 1
+            waited = time.monotonic() - enqueued
+            LLM_QUEUE_WAIT.labels(str(priority)).observe(waited)
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+            # The next waiter may now be at the head of the queue
+            self._cond.notify_all()
+
+        succeeded = False
+        try:
+            with track("gemini", label or getattr(fn, "__name__", "call")):
+                result = fn(*args, **kwargs)
+            succeeded = True
+            return result
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._stats["completed" if succeeded else "failed"] += 1
+                self._cond.notify_all()
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["by_priority"] = dict(self._stats["by_priority"])
+            stats["queue_depth"] = len(self._queue)
+            stats["in_flight"] = self._active
+        admitted = stats["submitted"] - stats["queue_depth"]
+        stats["avg_wait_seconds"] = round(stats["total_wait_seconds"] / admitted, 4) if admitted else 0.0
+        return stats
+
+
+# === FAKE BACKEND (LLM_BACKEND=fake) ===
+
+class FakeLLMResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.content = text
+        self.usage_metadata = {"input_tokens": 0, "output_tokens": len(text.split()), "total_tokens": len(text.split())}
+
+
+class FakeLLM:
+    """Local stand-in for Gemini with both the LangChain (`invoke`) and google-generativeai
+    (`generate_content`) call shapes; replies with JSON that every caller can parse."""
+
+    def __init__(self, latency: float = None):
+        self.latency = latency if latency is not None else float(os.getenv("FAKE_LLM_LATENCY", "0.2"))
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _reply(self) -> FakeLLMResponse:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return FakeLLMResponse(json.dumps({
+            "description": "Fake task: dispatch responders to the reported location.",
+            "roles": "vol",
+            "reasoning": "Fake LLM backend",
+            "resource_utilization": "none",
+            "government_report": "Fake government report.",
+            "citizen_survival_guide": "Fake citizen survival guide.",
+        }))
+
+    def invoke(self, messages, **kwargs):
+        return self._reply()
+
+    def generate_content(self, prompt, **kwargs):
+        return self._reply()
+
+    def stream(self, messages, **kwargs):
+        for word in self._reply().text.split(" "):
+            yield FakeLLMResponse(word + " ")
+
+
+def use_fake_llm() -> bool:
+    return os.getenv("LLM_BACKEND", "gemini").lower() == "fake"
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+    requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60")),
+    burst=int(os.getenv("LLM_BURST", "10")),
+)
@@ -0,0 +1,41 @@
+import itertools
+import os
+import time
+from collections import deque
+
+MAX_LOG_ENTRIES = int(os.getenv("AI_MATRIX_MAX_LOGS", "300"))
+ECHO_LOGS = os.getenv("APP_ENV", "development") != "production"
+
+
+class MatrixLogCollector:
+    """Per-report AI matrix log shared by the coordinator and its parallel workers.
+
+    `add` needs no lock: the sequence number comes from itertools.count and the entry
+    goes into a bounded deque, both atomic under the GIL. When the cap is reached the
+    oldest entries are dropped and counted.
+    """
+
+    def __init__(self, max_entries: int = MAX_LOG_ENTRIES, echo: bool = ECHO_LOGS):
+        self._entries = deque(maxlen=max_entries)
+        self._seq = itertools.count()
+        self.echo = echo
+
+    def add(self, message: str, component: str = "system", level: str = "info"):
+        self._entries.append({
+            "seq": next(self._seq),
+            "time": round(time.time(), 3),
+            "component": component,
+            "level": level,
+            "message": message
+        })
+        if self.echo:
+            print(message)
+
+    def flush(self) -> dict:
+        """Compact, ordered record of the collected entries"""
+        entries = sorted(list(self._entries), key=lambda entry: entry["seq"])
+        total = entries[-1]["seq"] + 1 if entries else 0
+        return {"logs": entries, "logs_dropped": total - len(entries)}
+
+    def __len__(self):
+        return len(self._entries)
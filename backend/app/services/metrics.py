@@ -0,0 +1,115 @@
+import contextvars
+import functools
+import time
+import uuid
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+STAGE_LATENCY = Histogram(
+    "tetraneurons_stage_latency_seconds",
+    "Latency of graph nodes, external calls and Firebase operations",
+    ["component", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "tetraneurons_stage_errors_total",
+    "Exceptions raised by graph nodes, external calls and Firebase operations",
+    ["component", "stage"],
+)
+STAGE_IN_FLIGHT = Gauge(
+    "tetraneurons_stage_in_flight",
+    "Operations currently running",
+    ["component", "stage"],
+)
+LLM_QUEUE_DEPTH = Gauge("tetraneurons_llm_queue_depth", "Gemini calls waiting in the scheduler")
+LLM_QUEUE_WAIT = Histogram(
+    "tetraneurons_llm_queue_wait_seconds",
+    "Time Gemini calls waited in the scheduler",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+HELP_REQUESTS = Counter(
+    "tetraneurons_help_requests_total",
+    "Help requests by coalescing outcome (merged into an existing task or new task)",
+    ["outcome"],
+)
+ROLE_DECISIONS = Counter(
+    "tetraneurons_role_decisions_total",
+    "Task role assignments by source (response cache, keyword rules or Gemini)",
+    ["generator", "source"],
+)
+LLM_JSON_REPLIES = Counter(
+    "tetraneurons_llm_json_replies_total",
+    "Gemini JSON replies by endpoint and outcome (parsed, repaired, failed, retry)",
+    ["endpoint", "outcome"],
+)
+CITIZEN_GUIDES = Counter(
+    "tetraneurons_citizen_guides_total",
+    "Citizen survival guides by source (generated, cached or personalized from a cached guide)",
+    ["source"],
+)
+REPORT_DEDUP = Counter(
+    "tetraneurons_report_dedup_total",
+    "Emergency reports by dedup outcome (duplicate of a recent disaster or new)",
+    ["outcome"],
+)
+ARTIFACT_BYTES_HELD = Gauge(
+    "tetraneurons_artifact_bytes_held",
+    "Bytes of report images (and their LLM encodings) held by the artifact store",
+)
+
+# Request-scoped trace id; copied into worker threads by submit_with_context / asyncio.to_thread
+trace_id_var = contextvars.ContextVar("trace_id", default="")
+
+
+def start_trace(trace_id: str = None) -> str:
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    trace_id_var.set(trace_id)
+    return trace_id
+
+
+def current_trace_id() -> str:
+    return trace_id_var.get()
+
+
+@contextmanager
+def track(component: str, stage: str):
+    """Record latency, errors and in-flight count of the wrapped block"""
+    in_flight = STAGE_IN_FLIGHT.labels(component, stage)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(component, stage).inc()
+        raise
+    finally:
+        trace_id = trace_id_var.get()
+        STAGE_LATENCY.labels(component, stage).observe(
+            time.perf_counter() - start,
+            exemplar={"trace_id": trace_id} if trace_id else None,
+        )
+        in_flight.dec()
+
+
+def instrumented(component: str, stage: str):
+    """Decorator form of track(), used to wrap LangGraph nodes"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track(component, stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit that keeps the caller's trace id in the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from app.services.dispatch_index import TASK_ROLES
+from app.services.geo_utils import cells_around, encode
+
+# Subscribers listen on precision-4 cells (~40 km) around their position
+PUSH_PRECISION = 4
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "100"))
+HEARTBEAT_SECONDS = 15
+
+
+class Subscription:
+    """One connected client: its cells, role and a bounded event buffer.
+
+    Must be created inside the event loop. When the buffer is full the oldest event is
+    dropped and the next delivered event is preceded by a "lagged" event, telling the
+    client to resync through the task feed cursor instead of blocking publishers.
+    """
+
+    def __init__(self, cells, role: str, maxsize: int = PUSH_QUEUE_SIZE):
+        self.cells = frozenset(cells)
+        self.role = role
+        self.loop = asyncio.get_running_loop()
+        self._buffer = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self._lagged = False
+
+    def offer(self, item):
+        """Runs in the event loop thread"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+            self._lagged = True
+        self._buffer.append(item)
+        self._ready.set()
+
+    async def events(self, heartbeat: float = HEARTBEAT_SECONDS):
+        """Yield (event, data) tuples, or None after `heartbeat` idle seconds"""
+        while True:
+            if not self._buffer:
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+            if self._lagged:
+                self._lagged = False
+                yield "lagged", {"dropped": self.dropped}
+            yield self._buffer.popleft()
+
+
+def _deliver(subscriptions, item):
+    for subscription in subscriptions:
+        subscription.offer(item)
+
+
+class PushGateway:
+    """Geo fan-out of new disasters and tasks to subscribed clients of this process.
+
+    Subscribers are indexed by geohash cell, so a publish touches only the subscribers
+    of the event's cell. `publish` may be called from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_cell = {}
+        self._subscribers = 0
+        self._stats = {"published": 0, "delivered": 0}
+
+    def subscribe(self, latitude: float, longitude: float, role: str) -> Subscription:
+        subscription = Subscription(cells_around(latitude, longitude, PUSH_PRECISION), role)
+        with self._lock:
+            for cell in subscription.cells:
+                self._by_cell.setdefault(cell, set()).add(subscription)
+            self._subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for cell in subscription.cells:
+                subscribers = self._by_cell.get(cell)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_cell[cell]
+            self._subscribers -= 1
+
+    def publish(self, event: str, data: dict, latitude, longitude, roles=None):
+        """Send to subscribers whose cells contain the point.
+
+        `roles` are task role codes ('vol', 'fr'); government subscribers receive every
+        event and None means everyone.
+        """
+        try:
+            cell = encode(float(latitude), float(longitude), precision=PUSH_PRECISION)
+            wanted = None if roles is None else {TASK_ROLES.get(role, role) for role in roles} | {"government"}
+            with self._lock:
+                targets = [s for s in self._by_cell.get(cell, ()) if wanted is None or s.role in wanted]
+                self._stats["published"] += 1
+                self._stats["delivered"] += len(targets)
+        except Exception as e:
+            print(f"Error publishing {event} notification: {e}")
+            return
+        # One wake-up per event loop instead of one per subscriber
+        by_loop = {}
+        for subscription in targets:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, subscriptions, (event, data))
+            except RuntimeError:
+                # Event loop already closed; the subscriptions are cleaned up by their handlers
+                pass
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            subscriptions = {s for subscribers in self._by_cell.values() for s in subscribers}
+            return {
+                **self._stats,
+                "subscribers": self._subscribers,
+                "cells": len(self._by_cell),
+                "dropped": sum(s.dropped for s in subscriptions),
+            }
+
+
+def task_notification(disaster_id: str, task: dict) -> dict:
+    """Compact task payload for push clients"""
+    return {
+        "disaster_id": disaster_id,
+        "task_id": task.get("task_id"),
+        "description": task.get("description"),
+        "roles": task.get("roles", []),
+        "urgency_level": task.get("urgency_level"),
+        "emergency_type": task.get("emergency_type"),
+        "latitude": task.get("latitude"),
+        "longitude": task.get("longitude"),
+        "updated_at": task.get("updated_at"),
+    }
+
+
+push_gateway = PushGateway()
+
+
+async def _bench(subscribers: int, idle_seconds: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    gateway = PushGateway()
+    points = [(rng.uniform(8, 30), rng.uniform(70, 90)) for _ in range(subscribers)]
+
+    async def consume(subscription):
+        # Like the SSE handler: wait on the buffer, wake for the heartbeat
+        async for _ in subscription.events():
+            pass
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscriptions = [gateway.subscribe(latitude, longitude, rng.choice(("volunteer", "first_responder")))
+                     for latitude, longitude in points]
+    consumers = [asyncio.create_task(consume(subscription)) for subscription in subscriptions]
+    await asyncio.sleep(0)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.sleep(idle_seconds)
+    idle_cpu = time.process_time() - cpu
+    idle_wall = time.perf_counter() - wall
+
+    start = time.perf_counter()
+    for latitude, longitude in points[:1000]:
+        gateway.publish("task", {}, latitude, longitude, ["vol"])
+    publish_seconds = time.perf_counter() - start
+    await asyncio.sleep(0)
+
+    pending = set(consumers)
+    while pending:
+        # wait_for may swallow a cancel that lands as its event is set, so cancel again
+        for consumer in pending:
+            consumer.cancel()
+        _, pending = await asyncio.wait(pending, timeout=1)
+    stats = gateway.get_stats()
+    for subscription in subscriptions:
+        gateway.unsubscribe(subscription)
+    return {
+        "subscribers": subscribers,
+        "cells": stats["cells"],
+        "memory_mb": round(used / 1024 / 1024, 2),
+        "memory_per_subscriber_kb": round(used / subscribers / 1024, 2),
+        "idle_seconds": round(idle_wall, 2),
+        "idle_cpu_percent": round(idle_cpu / idle_wall * 100, 2),
+        "publish_us": round(publish_seconds / 1000 * 1_000_000, 2),
+        "delivered": stats["delivered"],
+    }
+
+
+def bench(subscribers: int = 10_000, idle_seconds: float = 30, seed: int = 7) -> dict:
+    """Memory and idle CPU of `subscribers` connected clients with nothing to deliver.
+
+    Each subscriber gets a consumer task like the SSE handler's. With the default
+    HEARTBEAT_SECONDS, keep idle_seconds above it to include the keepalive wake-ups.
+    """
+    return asyncio.run(_bench(subscribers, idle_seconds, seed))
+
+
+if __name__ == "__main__":
+    # python -m app.services.push_gateway --bench [subscribers] [idle_seconds]
+    if sys.argv[1:2] != ["--bench"]:
+        sys.exit("usage: python -m app.services.push_gateway --bench [subscribers] [idle_seconds]")
+    args = sys.argv[2:4]
+    print(json.dumps(bench(*(int(args[0]), float(args[1]))[:len(args)]), indent=2))
@@ -0,0 +1,347 @@
+import asyncio
+import json
+import os
+import time
+import zipfile
+from io import BytesIO
+
+from app.services.artifact_store import artifact_store
+from app.services.cnn_model import analyze_image_with_summary, analyze_images_with_summary, disaster_model, yolo_model, device
+from app.services.emergency_multiagent_workflow import (
+    analysis_graph,
+    attach_corroborating_report,
+    build_gdac_data,
+    build_initial_state,
+    fetch_gdacs_feed,
+    fetch_weather,
+    generate_geohash_date_uuid,
+    publish_saved_report,
+    stage_report_records,
+    upload_executor,
+    upload_image_to_firebase_storage,
+)
+from app.services.First_Task_Generation import schedule_first_task_draft
+from app.services.geo_utils import encode
+from app.services.metrics import start_trace, submit_with_context, track
+from app.services.report_dedup import REPORT_DEDUP_ENABLED, image_dhash, report_deduplicator
+from app.services.rtdb_writer import WriteBatch
+
+REPORT_BATCH_MAX_ITEMS = int(os.getenv("REPORT_BATCH_MAX_ITEMS", "100"))
+REPORT_BATCH_MAX_BYTES = int(os.getenv("REPORT_BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+# Images per CNN forward pass / YOLO call
+REPORT_BATCH_CNN_SIZE = int(os.getenv("REPORT_BATCH_CNN_SIZE", "16"))
+# Reports analysed by Gemini at once (calls are also bounded by the LLM scheduler)
+REPORT_BATCH_CONCURRENCY = int(os.getenv("REPORT_BATCH_CONCURRENCY", "4"))
+# Saved reports per multi-path RTDB update
+REPORT_BATCH_WRITE_SIZE = 20
+# Reports in one ~5 km cell share a weather lookup
+AREA_PRECISION = 5
+
+REQUIRED_FIELDS = ("emergencyType", "urgencyLevel", "situation", "peopleCount", "latitude", "longitude", "image")
+
+
+def read_archive(data: bytes) -> tuple:
+    """(manifest, {filename: bytes}) of a zip holding manifest.json and the report images"""
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if sum(info.file_size for info in members) > REPORT_BATCH_MAX_BYTES:
+            raise ValueError("Archive is too large once extracted")
+        manifest = json.loads(archive.read("manifest.json"))
+        images = {info.filename: archive.read(info) for info in members if info.filename != "manifest.json"}
+    return manifest, images
+
+
+def capture_time(value) -> float:
+    """Unix seconds of a manifest `submittedTime` (seconds or milliseconds), never in the future"""
+    now = time.time()
+    if value in (None, ""):
+        return now
+    try:
+        timestamp = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid submittedTime")
+    if timestamp > 1e11:
+        timestamp /= 1000
+    return min(timestamp, now)
+
+
+def validate_item(entry, images: dict) -> dict:
+    """Report fields of one manifest entry with its image bytes, raising ValueError if unusable"""
+    if not isinstance(entry, dict):
+        raise ValueError("Manifest entry must be an object")
+    missing = [field for field in REQUIRED_FIELDS if entry.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    try:
+        latitude, longitude = float(entry["latitude"]), float(entry["longitude"])
+    except (TypeError, ValueError):
+        raise ValueError("Invalid latitude or longitude")
+    if not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180):
+        raise ValueError("Invalid latitude or longitude")
+    image_bytes = images.get(entry["image"])
+    if not image_bytes:
+        raise ValueError(f"Image '{entry['image']}' not found in the upload")
+    return {
+        "emergencyType": str(entry["emergencyType"]),
+        "urgencyLevel": str(entry["urgencyLevel"]),
+        "situation": str(entry["situation"]),
+        "peopleCount": str(entry["peopleCount"]),
+        "latitude": latitude,
+        "longitude": longitude,
+        # Offline devices send the capture time; the upload can be hours later
+        "submitted_time": capture_time(entry.get("submittedTime")),
+        "image_bytes": image_bytes,
+    }
+
+
+def run_vision(reports: list) -> list:
+    """CNN/YOLO summaries in batches of REPORT_BATCH_CNN_SIZE (an Exception in place of a failed image)"""
+    results = []
+    for start in range(0, len(reports), REPORT_BATCH_CNN_SIZE):
+        chunk = [BytesIO(report["image_bytes"]) for report in reports[start:start + REPORT_BATCH_CNN_SIZE]]
+        try:
+            with track("model", "cnn_yolo_batch"):
+                results.extend(analyze_images_with_summary(chunk, disaster_model, yolo_model, device))
+        except Exception:
+            # One unreadable image fails the whole pass; retry one by one to isolate it
+            for image in chunk:
+                try:
+                    image.seek(0)
+                    with track("model", "cnn_yolo"):
+                        results.append(analyze_image_with_summary(image, disaster_model, yolo_model, device))
+                except Exception as e:
+                    results.append(e)
+    return results
+
+
+def event(report: dict, stage: str, **fields) -> dict:
+    return {"index": report["index"], "id": report["client_id"], "stage": stage, **fields}
+
+
+def corroboration_record(report: dict, user_id: str) -> dict:
+    return {
+        'emergency_type': report["emergencyType"],
+        'urgency_level': report["urgencyLevel"],
+        'situation': report["situation"],
+        'people_count': report["peopleCount"],
+        'latitude': report["latitude"],
+        'longitude': report["longitude"],
+        'image_phash': report["image_phash"],
+        'user_id': user_id,
+        'submitted_time': report["submitted_time"]
+    }
+
+
+def candidate_entry(report: dict) -> dict:
+    """disaster_index-shaped entry of a report analysed in the current round"""
+    return {
+        'emergency_type': report["emergencyType"],
+        'urgency_level': report["urgencyLevel"],
+        'people_count': report["peopleCount"],
+        'latitude': report["latitude"],
+        'longitude': report["longitude"],
+        'status': 'pending',
+        'created_at': report["submitted_time"],
+        'image_phash': report["image_phash"]
+    }
+
+
+async def ingest_report_batch(manifest: list, images: dict, user):
+    """Process a batch of offline reports, yielding progress events per item.
+
+    Stages: "failed" (invalid or errored), "duplicate" (attached to a recent disaster),
+    "vision" (CNN/YOLO done), "analyzed" (Gemini done), "saved"; a final "summary".
+    Images go through batched CNN/YOLO, the GDACS feed is fetched once, weather once
+    per area cell, and saved reports are written in grouped multi-path updates.
+
+    Reports are only attached to saved disasters. Reports of this batch that match
+    another report being analysed wait for the next round: by then it is saved and
+    they attach to it, or it failed and they are analysed themselves.
+    """
+    started = time.time()
+    user_id = getattr(user, 'uid', 'anonymous')
+    stats = {"items": len(manifest), "duplicates": 0, "saved": 0, "failed": 0,
+             "cnn_batches": 0, "weather_lookups": 0, "gdacs_fetches": 0, "rtdb_writes": 0}
+
+    reports = []
+    for index, entry in enumerate(manifest):
+        client_id = entry.get("id", index) if isinstance(entry, dict) else index
+        try:
+            report = validate_item(entry, images)
+        except ValueError as e:
+            stats["failed"] += 1
+            yield {"index": index, "id": client_id, "stage": "failed", "error": str(e)}
+            continue
+        report["disaster_id"] = generate_geohash_date_uuid(report["latitude"], report["longitude"], report["submitted_time"])
+        report["image_phash"] = ""
+        if REPORT_DEDUP_ENABLED:
+            try:
+                report["image_phash"] = await asyncio.to_thread(image_dhash, report["image_bytes"])
+            except Exception as e:
+                print(f"Report dedup skipped: {str(e)}")
+        reports.append({**report, "index": index, "client_id": client_id})
+
+    async def lookup(fetch, *args):
+        try:
+            return await asyncio.to_thread(fetch, *args)
+        except Exception as e:
+            return {"error": str(e)}
+
+    feed = None
+    weather_by_area = {}
+    pending = reports
+    while pending:
+        # Dedup against saved disasters and the reports analysed in this round
+        fresh, deferred, round_candidates = [], [], {}
+        for report in pending:
+            duplicate = None
+            if REPORT_DEDUP_ENABLED:
+                try:
+                    duplicate = await asyncio.to_thread(
+                        report_deduplicator.find_duplicate, report["emergencyType"], report["latitude"], report["longitude"],
+                        report["image_phash"], report["urgencyLevel"], report["peopleCount"], report["submitted_time"],
+                        round_candidates
+                    )
+                except Exception as e:
+                    print(f"Report dedup skipped: {str(e)}")
+            if duplicate is not None and duplicate["disaster_id"] in round_candidates:
+                deferred.append(report)
+                continue
+            if duplicate is not None:
+                try:
+                    result = await attach_corroborating_report(duplicate, report["disaster_id"], corroboration_record(report, user_id), report["image_bytes"])
+                except Exception as e:
+                    stats["failed"] += 1
+                    yield event(report, "failed", error=f"Failed to attach corroborating report: {str(e)}")
+                    continue
+                if result is not None:
+                    report_deduplicator.record_outcome(True)
+                    stats["duplicates"] += 1
+                    yield event(report, "duplicate", disaster_id=result["disaster_id"], report_id=result["report_id"])
+                    continue
+            if REPORT_DEDUP_ENABLED:
+                report_deduplicator.record_outcome(False)
+                round_candidates[report["disaster_id"]] = candidate_entry(report)
+            fresh.append(report)
+        pending = deferred
+
+        if not fresh:
+            continue
+
+        # Batched vision and shared lookups run side by side
+        areas = {}
+        for report in fresh:
+            report["area"] = encode(report["latitude"], report["longitude"], AREA_PRECISION)
+            if report["area"] not in weather_by_area:
+                areas.setdefault(report["area"], (report["latitude"], report["longitude"]))
+        stats["cnn_batches"] += -(-len(fresh) // REPORT_BATCH_CNN_SIZE)
+        stats["weather_lookups"] += len(areas)
+        lookups = [lookup(fetch_weather, lat, lon) for lat, lon in areas.values()]
+        if feed is None:
+            stats["gdacs_fetches"] = 1
+            lookups.append(lookup(fetch_gdacs_feed))
+
+        vision, *fetched = await asyncio.gather(asyncio.to_thread(run_vision, fresh), *lookups)
+        if feed is None:
+            feed = fetched.pop()
+        weather_by_area.update(zip(areas, fetched))
+
+        analyzable = []
+        for report, cnn_result in zip(fresh, vision):
+            if isinstance(cnn_result, Exception):
+                stats["failed"] += 1
+                yield event(report, "failed", error=f"Image analysis failed: {str(cnn_result)}")
+                continue
+            report["cnn_result"] = cnn_result
+            analyzable.append(report)
+            yield event(report, "vision", cnn_result=cnn_result)
+
+        async for saved in analyze_and_save(analyzable, feed, weather_by_area, user_id, stats):
+            yield saved
+
+    yield {"stage": "summary", **stats, "elapsed_seconds": round(time.time() - started, 3)}
+
+
+async def analyze_and_save(analyzable: list, feed, weather_by_area: dict, user_id: str, stats: dict):
+    """Gemini analysis of reports with vision results, saved in grouped multi-path updates"""
+    semaphore = asyncio.Semaphore(REPORT_BATCH_CONCURRENCY)
+
+    async def analyze(report: dict) -> tuple:
+        async with semaphore:
+            start_trace(report["disaster_id"])
+            ai_start = time.time()
+            upload_future = submit_with_context(upload_executor, upload_image_to_firebase_storage, report["image_bytes"], report["disaster_id"])
+            image_ref = artifact_store.put(report["image_bytes"])
+            state = build_initial_state(
+                report["disaster_id"], image_ref, report["image_phash"], report["emergencyType"], report["urgencyLevel"],
+                report["situation"], report["peopleCount"], report["latitude"], report["longitude"], user_id,
+                report["submitted_time"], ai_start
+            )
+            weather = weather_by_area[report["area"]]
+            gdac = feed if isinstance(feed, dict) else build_gdac_data(feed, report["latitude"], report["longitude"])
+            state.update({
+                "cnn_result": report["cnn_result"],
+                "weather": weather,
+                "gdac_disasters": gdac,
+                "parallel_tasks_completed": True,
+                "agents_status": {
+                    "computer_vision_tool": "completed",
+                    "weather_data_tool": "failed" if "error" in weather else "completed",
+                    "disaster_history_tool": "failed" if "error" in gdac else "completed",
+                    "government_analysis_ai": "pending",
+                    "citizen_survival_ai": "pending"
+                }
+            })
+            try:
+                final_state = await asyncio.to_thread(analysis_graph.invoke, state)
+            except Exception:
+                upload_future.cancel()
+                raise
+            finally:
+                artifact_store.release(image_ref)
+            final_state["ai_processing_end_time"] = time.time()
+            final_state["image_url"] = await asyncio.wrap_future(upload_future)
+            return report, final_state, final_state["ai_processing_end_time"] - ai_start
+
+    async def guarded(report: dict) -> tuple:
+        try:
+            return await analyze(report)
+        except Exception as e:
+            return report, e, 0.0
+
+    batch, staged = WriteBatch(), []
+
+    async def flush():
+        nonlocal batch, staged
+        to_commit, committed = batch, staged
+        batch, staged = WriteBatch(), []
+        try:
+            await asyncio.to_thread(to_commit.commit, "save_report_batch")
+            stats["rtdb_writes"] += 1
+        except Exception as e:
+            stats["failed"] += len(committed)
+            return [event(report, "failed", error=f"Failed to save report: {str(e)}") for report, _, _ in committed]
+        events = []
+        for report, disaster_data, processing_time in committed:
+            publish_saved_report(report["disaster_id"], disaster_data)
+            report_deduplicator.record_pipeline(processing_time)
+            schedule_first_task_draft(report["disaster_id"])
+            stats["saved"] += 1
+            events.append(event(report, "saved", disaster_id=report["disaster_id"]))
+        return events
+
+    for finished in asyncio.as_completed([guarded(report) for report in analyzable]):
+        report, final_state, processing_time = await finished
+        if isinstance(final_state, Exception):
+            stats["failed"] += 1
+            yield event(report, "failed", error=f"Analysis failed: {str(final_state)}")
+            continue
+        yield event(report, "analyzed", status=final_state["status"], processing_time=round(processing_time, 3))
+        disaster_data = stage_report_records(batch, final_state, report["disaster_id"], processing_time)
+        staged.append((report, disaster_data, processing_time))
+        if len(staged) >= REPORT_BATCH_WRITE_SIZE:
+            for saved in await flush():
+                yield saved
+    if staged:
+        for saved in await flush():
+            yield saved
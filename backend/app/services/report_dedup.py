@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from io import BytesIO
+
+from firebase_admin import db
+from PIL import Image
+
+from app.services.geo_utils import cells_around, haversine_km
+from app.services.llm_scheduler import urgency_priority
+from app.services.metrics import REPORT_DEDUP, track
+
+REPORT_DEDUP_ENABLED = os.getenv("REPORT_DEDUP", "true").lower() == "true"
+REPORT_DEDUP_WINDOW_SECONDS = int(os.getenv("REPORT_DEDUP_WINDOW_SECONDS", "3600"))
+REPORT_DEDUP_RADIUS_KM = float(os.getenv("REPORT_DEDUP_RADIUS_KM", "1.0"))
+# Differing bits of the 64-bit dHash still counted as the same scene
+REPORT_DEDUP_HASH_DISTANCE = int(os.getenv("REPORT_DEDUP_HASH_DISTANCE", "10"))
+# Reports this close of the same type corroborate each other even from another angle
+REPORT_DEDUP_SAME_SPOT_KM = float(os.getenv("REPORT_DEDUP_SAME_SPOT_KM", "0.15"))
+
+INDEX_PRECISION = 4  # disaster_index/{geohash4}/{id}
+SEARCH_PRECISION = 5  # ~5 km cells, their neighbours cover REPORT_DEDUP_RADIUS_KM
+
+
+def image_dhash(image_bytes: bytes, hash_size: int = 8) -> str:
+    """64-bit difference hash (hex) of the image; near-identical photos differ in few bits"""
+    image = Image.open(BytesIO(image_bytes)).convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(image.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (hash_size + 1) + col + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hash_distance(a: str, b: str):
+    """Hamming distance of two hex hashes, None if either is missing"""
+    if not a or not b:
+        return None
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def escalates(urgency, people_count, entry: dict) -> bool:
+    """True when the new report is more urgent or counts more people than the indexed disaster"""
+    if urgency is not None and urgency_priority(urgency) < urgency_priority(entry.get("urgency_level")):
+        return True
+    try:
+        return int(str(people_count).strip()) > int(str(entry.get("people_count")).strip())
+    except (TypeError, ValueError):
+        return False
+
+
+class ReportDeduplicator:
+    """Matches new reports against recent disasters of the same type and place.
+
+    Candidates come from disaster_index, so only saved disasters are matched: a report
+    whose first sighting is still being analysed (and may fail) gets its own pipeline.
+    A candidate matches when it lies within the radius and time window and either its
+    image hash is close or it is on the same spot. Reports that are more urgent or count
+    more people than the disaster are never attached, they need their own analysis.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"reports": 0, "duplicates": 0, "pipeline_seconds": 0.0, "pipelines": 0}
+
+    def record_pipeline(self, pipeline_seconds: float):
+        """Record the pipeline time of a saved report (the cost a duplicate avoids)"""
+        with self._lock:
+            self._stats["pipelines"] += 1
+            self._stats["pipeline_seconds"] += pipeline_seconds
+
+    def _indexed_candidates(self, latitude: float, longitude: float) -> dict:
+        index_ref = db.reference("disaster_index")
+        candidates = {}
+        for cell in {cell[:INDEX_PRECISION] for cell in cells_around(latitude, longitude, SEARCH_PRECISION)}:
+            with track("rtdb", "fetch_disaster_index"):
+                candidates.update(index_ref.child(cell).get() or {})
+        return candidates
+
+    def find_duplicate(self, emergency_type: str, latitude, longitude, image_phash: str, urgency=None, people_count=None,
+                       at: float = None, extra_candidates: dict = None):
+        """Best matching recent disaster {"disaster_id", "distance_km", "hash_distance"} or None.
+
+        `at` is the report's capture time (default now); the window is measured from it.
+        `extra_candidates` ({id: index-shaped entry}) are matched alongside the saved disasters.
+        """
+        latitude, longitude = float(latitude), float(longitude)
+        emergency_type = str(emergency_type).strip().lower()
+        now = time.time() if at is None else float(at)
+        candidates = {**self._indexed_candidates(latitude, longitude), **(extra_candidates or {})}
+
+        best, best_key = None, None
+        for disaster_id, entry in candidates.items():
+            try:
+                if str(entry.get("emergency_type", "")).strip().lower() != emergency_type:
+                    continue
+                if entry.get("status") == "archived" or abs(now - float(entry.get("created_at", 0))) > REPORT_DEDUP_WINDOW_SECONDS:
+                    continue
+                if escalates(urgency, people_count, entry):
+                    continue
+                distance = haversine_km(latitude, longitude, entry["latitude"], entry["longitude"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if distance > REPORT_DEDUP_RADIUS_KM:
+                continue
+            bits = hash_distance(image_phash, entry.get("image_phash"))
+            if not ((bits is not None and bits <= REPORT_DEDUP_HASH_DISTANCE) or distance <= REPORT_DEDUP_SAME_SPOT_KM):
+                continue
+            key = (bits if bits is not None else REPORT_DEDUP_HASH_DISTANCE + 1, distance)
+            if best_key is None or key < best_key:
+                best_key = key
+                best = {"disaster_id": disaster_id, "distance_km": round(distance, 3), "hash_distance": bits}
+        return best
+
+    def record_outcome(self, duplicate: bool):
+        REPORT_DEDUP.labels("duplicate" if duplicate else "new").inc()
+        with self._lock:
+            self._stats["reports"] += 1
+            if duplicate:
+                self._stats["duplicates"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        average = stats["pipeline_seconds"] / stats["pipelines"] if stats["pipelines"] else 0.0
+        stats["dedup_rate"] = round(stats["duplicates"] / stats["reports"], 4) if stats["reports"] else 0.0
+        # Each duplicate skips one CNN pass, the weather/GDACS lookups and two Gemini calls
+        stats["pipeline_seconds_saved_est"] = round(stats["duplicates"] * average, 3)
+        stats["gemini_calls_saved"] = stats["duplicates"] * 2
+        del stats["pipeline_seconds"]
+        return stats
+
+
+report_deduplicator = ReportDeduplicator()
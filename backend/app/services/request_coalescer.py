@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+
+from app.services.geo_utils import haversine_km
+from app.services.llm_scheduler import urgency_priority
+from app.services.metrics import HELP_REQUESTS
+from app.services.task_cache import jaccard, tokenize
+
+COALESCE_WINDOW_SECONDS = int(os.getenv("HELP_COALESCE_WINDOW_SECONDS", "600"))
+COALESCE_RADIUS_KM = float(os.getenv("HELP_COALESCE_RADIUS_KM", "0.5"))
+COALESCE_SIMILARITY = float(os.getenv("HELP_COALESCE_SIMILARITY", "0.5"))
+
+
+class RequestCoalescer:
+    """Groups near-duplicate help requests of one disaster onto a shared task.
+
+    A request joins the open group of an earlier request for the same disaster when it
+    arrives within the time window, lies within the radius and its help text is similar
+    enough (Jaccard over the normalised words). Requests more urgent than the group's
+    task always get a task of their own. Groups live in this process only.
+    """
+
+    def __init__(self, window_seconds: int = COALESCE_WINDOW_SECONDS, radius_km: float = COALESCE_RADIUS_KM,
+                 similarity: float = COALESCE_SIMILARITY):
+        self.window_seconds = window_seconds
+        self.radius_km = radius_km
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._groups = {}  # disaster_id -> list of open groups
+        self._stats = {"requests": 0, "merged": 0}
+
+    def _open_groups(self, disaster_id: str, now: float) -> list:
+        groups = [g for g in self._groups.get(disaster_id, []) if now - g["created"] <= self.window_seconds]
+        if groups:
+            self._groups[disaster_id] = groups
+        else:
+            self._groups.pop(disaster_id, None)
+        return groups
+
+    def match(self, disaster_id: str, help_text: str, urgency, latitude, longitude):
+        """Join the best matching group and return its task (a copy) with the new request count, or None"""
+        now = time.time()
+        tokens = tokenize(help_text)
+        priority = urgency_priority(urgency)
+        with self._lock:
+            self._stats["requests"] += 1
+            best, best_score = None, 0.0
+            for group in self._open_groups(disaster_id, now):
+                if priority < group["priority"]:
+                    continue
+                if haversine_km(float(latitude), float(longitude), group["latitude"], group["longitude"]) > self.radius_km:
+                    continue
+                score = jaccard(tokens, group["tokens"])
+                if score >= self.similarity and score > best_score:
+                    best, best_score = group, score
+            if best is None:
+                HELP_REQUESTS.labels("new").inc()
+                return None
+            best["request_count"] += 1
+            self._stats["merged"] += 1
+            HELP_REQUESTS.labels("merged").inc()
+            return {**best["task"], "request_count": best["request_count"]}
+
+    def register(self, disaster_id: str, task: dict, help_text: str, urgency):
+        """Open a group for a newly generated task"""
+        try:
+            latitude, longitude = float(task["latitude"]), float(task["longitude"])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            self._open_groups(disaster_id, time.time())
+            self._groups.setdefault(disaster_id, []).append({
+                "task": dict(task),
+                "tokens": tokenize(help_text),
+                "priority": urgency_priority(urgency),
+                "latitude": latitude,
+                "longitude": longitude,
+                "created": time.time(),
+                "request_count": 1,
+            })
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open_groups"] = sum(len(groups) for groups in self._groups.values())
+        stats["merge_rate"] = round(stats["merged"] / stats["requests"], 4) if stats["requests"] else 0.0
+        return stats
+
+
+request_coalescer = RequestCoalescer()
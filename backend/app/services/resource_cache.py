@@ -0,0 +1,132 @@
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from cachetools import TTLCache
+from firebase_admin import firestore
+
+from app.services.geo_utils import cells_around, encode, nearest_k
+from app.services.metrics import track
+
+RESOURCE_CACHE_TTL = 600
+RESOURCE_CACHE_MAX_DISASTERS = 64
+# Geohash precisions searched in order: ~5 km cells, then ~40 km cells (each with neighbours)
+SEARCH_PRECISIONS = (5, 4)
+
+
+class DisasterResources:
+    """All resources of one disaster, bucketed by geohash cell for spatial lookup"""
+
+    def __init__(self, resources: list):
+        self.all = []
+        self.by_cell = {precision: defaultdict(list) for precision in SEARCH_PRECISIONS}
+        for resource in resources:
+            self.add(resource)
+
+    def add(self, resource: dict):
+        cell = resource.get("geohash")
+        if not cell:
+            try:
+                cell = encode(resource["latitude"], resource["longitude"])
+            except (KeyError, TypeError, ValueError):
+                return
+        for precision in SEARCH_PRECISIONS:
+            self.by_cell[precision][cell[:precision]].append(resource)
+        self.all.append(resource)
+
+    def nearby(self, latitude, longitude, k: int) -> list:
+        candidates = self.all
+        for precision in SEARCH_PRECISIONS:
+            cells = self.by_cell[precision]
+            found = [r for cell in cells_around(latitude, longitude, precision) for r in cells.get(cell, ())]
+            if len(found) >= k:
+                candidates = found
+                break
+        return nearest_k(candidates, latitude, longitude, k)
+
+
+class ResourceCache:
+    """In-process cache of each disaster's resources.
+
+    Filled in the background after the first lookup for a disaster, patched by the
+    resource endpoints on write, and refreshed after RESOURCE_CACHE_TTL seconds (which
+    also bounds staleness when several worker processes each hold their own cache).
+    At most `maxsize` disasters are held; the least recently used one is evicted first.
+    """
+
+    def __init__(self, ttl: int = RESOURCE_CACHE_TTL, maxsize: int = RESOURCE_CACHE_MAX_DISASTERS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._disasters = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._loading = {}  # disaster_id -> resources written while its load was running
+        self._invalidated = set()
+        self._loader = ThreadPoolExecutor(max_workers=2)
+        self._stats = {"hits": 0, "misses": 0, "loads": 0}
+
+    def nearby(self, disaster_id: str, latitude, longitude, k: int):
+        """Closest k resources from the cache, or None if the disaster is not cached yet"""
+        with self._lock:
+            entry = self._disasters.get(disaster_id)
+            self._stats["misses" if entry is None else "hits"] += 1
+        if entry is None:
+            self.warm(disaster_id)
+            return None
+        return entry.nearby(latitude, longitude, k)
+
+    def warm(self, disaster_id: str):
+        """Load the disaster's resources in the background (once at a time)"""
+        with self._lock:
+            if disaster_id in self._loading:
+                return
+            self._loading[disaster_id] = []
+            self._invalidated.discard(disaster_id)
+        self._loader.submit(self._load, disaster_id)
+
+    def _load(self, disaster_id: str):
+        try:
+            items_ref = firestore.client().collection("resources").document(disaster_id).collection("items")
+            resources = []
+            with track("firestore", "load_resource_cache"):
+                for resource in items_ref.stream():
+                    resource_data = resource.to_dict()
+                    resource_data["resource_id"] = resource.id
+                    resources.append(resource_data)
+            entry = DisasterResources(resources)
+            with self._lock:
+                # Writes that landed after the stream read its page are applied on top
+                loaded_ids = {resource["resource_id"] for resource in resources}
+                for resource in self._loading.get(disaster_id, ()):
+                    if resource.get("resource_id") not in loaded_ids:
+                        entry.add(resource)
+                if disaster_id not in self._invalidated:
+                    self._disasters[disaster_id] = entry
+                self._stats["loads"] += 1
+        except Exception as e:
+            print(f"Error loading resource cache for {disaster_id}: {e}")
+        finally:
+            with self._lock:
+                self._loading.pop(disaster_id, None)
+                self._invalidated.discard(disaster_id)
+
+    def add(self, disaster_id: str, resource: dict):
+        """Patch a newly written resource into the cached disaster, if cached"""
+        with self._lock:
+            entry = self._disasters.get(disaster_id)
+            if entry is not None:
+                entry.add(resource)
+            if disaster_id in self._loading:
+                self._loading[disaster_id].append(resource)
+
+    def invalidate(self, disaster_id: str):
+        with self._lock:
+            self._disasters.pop(disaster_id, None)
+            # A load already running read the data before the change; drop its result
+            if disaster_id in self._loading:
+                self._invalidated.add(disaster_id)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "disasters_cached": len(self._disasters)}
+
+
+resource_cache = ResourceCache()
@@ -0,0 +1,180 @@
+import asyncio
+import csv
+import json
+import time
+
+from firebase_admin import firestore
+
+from app.services.geo_utils import encode
+from app.services.metrics import track
+from app.services.resource_cache import resource_cache
+
+FIRESTORE_BATCH_LIMIT = 500
+MAX_REPORTED_ERRORS = 200
+REQUIRED_FIELDS = ("name", "latitude", "longitude")
+
+
+async def iter_lines(chunks):
+    """Decoded lines of a streamed request body, without loading it all into memory"""
+    buffer = b""
+    first = True
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig" if first else "utf-8").rstrip("\r")
+            first = False
+    if buffer:
+        yield buffer.decode("utf-8-sig" if first else "utf-8").rstrip("\r")
+
+
+async def iter_csv_records(lines):
+    """Complete CSV records, joining the lines of quoted fields that contain newlines"""
+    record = None
+    async for line in lines:
+        record = line if record is None else record + "\n" + line
+        # An odd quote count means a quoted field is still open ("" escapes keep it even)
+        if record.count('"') % 2 == 0:
+            yield record
+            record = None
+    if record is not None:
+        yield record
+
+
+async def iter_rows(lines, fmt: str):
+    """(row number, dict or parse error) for every non-empty NDJSON line / CSV record"""
+    header = None
+    row_number = 0
+    if fmt == "csv":
+        lines = iter_csv_records(lines)
+    async for line in lines:
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row_number += 1
+            if len(values) != len(header):
+                yield row_number, ValueError(f"expected {len(header)} columns, got {len(values)}")
+                continue
+            yield row_number, {k: v.strip() for k, v in zip(header, values) if v.strip() != ""}
+        else:
+            row_number += 1
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, ValueError(f"invalid JSON: {e.msg}")
+                continue
+            if not isinstance(row, dict):
+                yield row_number, ValueError("row must be a JSON object")
+                continue
+            yield row_number, row
+
+
+def validate_resource(row: dict) -> dict:
+    """Normalised resource document with its geohash; raises ValueError on bad rows"""
+    missing = [field for field in REQUIRED_FIELDS if row.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    try:
+        latitude = float(row["latitude"])
+        longitude = float(row["longitude"])
+    except (TypeError, ValueError):
+        raise ValueError("latitude and longitude must be numbers")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("coordinates out of range")
+    return {**row, "latitude": latitude, "longitude": longitude, "geohash": encode(latitude, longitude)}
+
+
+class BulkResourceWriter:
+    """Writes resources of one disaster in Firestore batches of up to 500.
+
+    At most one batch commit runs (in a worker thread) while the next batch is being
+    parsed; committed resources are patched into the resource cache.
+    """
+
+    def __init__(self, disaster_id: str):
+        self.disaster_id = disaster_id
+        self.items_ref = firestore.client().collection("resources").document(disaster_id).collection("items")
+        self.pending = []
+        self.in_flight = None
+        self.written = 0
+        self.errors = []
+        self.error_count = 0
+
+    def add_error(self, row_number: int, error: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": error})
+
+    async def add(self, row_number: int, resource: dict):
+        self.pending.append((row_number, resource))
+        if len(self.pending) >= FIRESTORE_BATCH_LIMIT:
+            await self.flush()
+
+    def _commit(self, rows: list) -> list:
+        batch = firestore.client().batch()
+        committed = []
+        for _, resource in rows:
+            doc_ref = self.items_ref.document()
+            batch.set(doc_ref, resource)
+            committed.append({**resource, "resource_id": doc_ref.id})
+        with track("firestore", "bulk_add_resources"):
+            batch.commit()
+        return committed
+
+    async def _wait(self):
+        if self.in_flight is None:
+            return
+        rows, task = self.in_flight
+        self.in_flight = None
+        try:
+            committed = await task
+        except Exception as e:
+            for row_number, _ in rows:
+                self.add_error(row_number, f"write failed: {e}")
+            return
+        self.written += len(committed)
+        for resource in committed:
+            resource_cache.add(self.disaster_id, resource)
+
+    async def flush(self):
+        await self._wait()
+        if self.pending:
+            rows, self.pending = self.pending, []
+            self.in_flight = (rows, asyncio.create_task(asyncio.to_thread(self._commit, rows)))
+
+    async def close(self):
+        await self.flush()
+        await self._wait()
+
+
+async def ingest_resources(disaster_id: str, chunks, fmt: str) -> dict:
+    """Validate and write a streamed NDJSON / CSV resource list; returns the ingestion report"""
+    start = time.perf_counter()
+    writer = BulkResourceWriter(disaster_id)
+    rows = 0
+    async for row_number, row in iter_rows(iter_lines(chunks), fmt):
+        rows += 1
+        if isinstance(row, Exception):
+            writer.add_error(row_number, str(row))
+            continue
+        try:
+            resource = validate_resource(row)
+        except ValueError as e:
+            writer.add_error(row_number, str(e))
+            continue
+        await writer.add(row_number, resource)
+    await writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "written": writer.written,
+        "failed": writer.error_count,
+        "errors": writer.errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,159 @@
+import json
+import os
+import re
+import sys
+
+# Below this confidence the decision is left to Gemini
+ROLE_RULES_MIN_CONFIDENCE = float(os.getenv("ROLE_RULES_MIN_CONFIDENCE", "0.8"))
+
+INAPPROPRIATE_KEYWORDS = ["joke", "funny", "lol", "haha", "prank", "fake", "test123", "just testing"]
+
+MASS_KEYWORDS = [
+    "many people", "multiple people", "crowd", "families", "everyone", "lots of", "hundreds",
+    "thousands", "many dead", "multiple casualties", "mass casualties", "devastating", "widespread",
+    "major", "large scale", "large-scale", "multiple buildings", "entire neighborhood",
+    "whole village", "community-wide", "evacuate", "evacuation",
+]
+
+FR_KEYWORDS = [
+    "medical", "injury", "injured", "hurt", "bleeding", "unconscious", "chest pain", "breathing",
+    "heart attack", "ambulance", "doctor", "hospital", "rescue", "trapped", "stuck", "fire",
+    "smoke", "gas leak", "hazard", "hazmat", "dying", "dead", "drowning", "collapse", "collapsed",
+    "explosion", "electrocuted", "fracture", "broken leg", "broken arm", "pregnant", "labour",
+    "labor", "seizure", "snake bite", "armed", "violence", "looting", "swept away",
+]
+
+VOL_KEYWORDS = [
+    "food", "water", "drinking water", "shelter", "blanket", "blankets", "clothes", "clothing",
+    "supplies", "diapers", "baby formula", "milk", "transport", "ride", "charging", "power bank",
+    "welfare check", "check on", "elderly neighbour", "elderly neighbor", "cleanup", "clean up",
+    "sandbags", "tent", "tents", "mattress", "hygiene", "sanitary", "cooking", "groceries",
+]
+
+CATEGORIES = {
+    "inappropriate": INAPPROPRIATE_KEYWORDS,
+    "mass": MASS_KEYWORDS,
+    "fr": FR_KEYWORDS,
+    "vol": VOL_KEYWORDS,
+}
+
+_KEYWORD_CATEGORY = {keyword: category for category, keywords in CATEGORIES.items() for keyword in keywords}
+# One alternation, longest keywords first so "gas leak" wins over shorter overlaps
+_KEYWORD_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(k) for k in sorted(_KEYWORD_CATEGORY, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+
+ROLE_CODES = {"vol": ["vol"], "fr": ["fr"], "both": ["vol", "fr"]}
+
+
+def match_keywords(text: str) -> dict:
+    """Category -> keywords found in the text (single pass over the combined pattern)"""
+    found = {category: [] for category in CATEGORIES}
+    for match in _KEYWORD_RE.finditer(str(text)):
+        keyword = match.group(0).lower()
+        found[_KEYWORD_CATEGORY[keyword]].append(keyword)
+    return found
+
+
+def is_large_group(people) -> bool:
+    try:
+        return int(str(people).strip()) > 50
+    except ValueError:
+        return any(word in str(people).lower() for word in ["many", "hundreds", "thousands", "community", "neighborhood"])
+
+
+def classify_roles(text: str, emergency_type: str = "", urgency: str = "", people=None) -> dict:
+    """Rule-based role decision with a confidence score.
+
+    Returns {"role": "vol" | "fr" | "both", "roles": [...], "confidence": 0..1,
+    "reasoning": str, "matches": {category: [keywords]}}. A confidence of 0 means no
+    rule applied and the caller should ask Gemini.
+    """
+    found = match_keywords(text)
+    for category, keywords in match_keywords(emergency_type).items():
+        found[category].extend(keywords)
+    fr, vol, mass = found["fr"], found["vol"], found["mass"]
+    large = bool(mass) or (people is not None and is_large_group(people))
+    high_urgency = str(urgency).strip().lower() in ("high", "urgent", "critical")
+
+    # "No joke, the water is rising" reads like a prank to a keyword match: Gemini judges these
+    if found["inappropriate"]:
+        role, confidence, reasoning = "vol", 0.0, "Possible joke or test, left to Gemini"
+    elif fr and large:
+        role, confidence, reasoning = "both", 0.9, "Professional response needed at large scale"
+    elif fr and vol:
+        role, confidence, reasoning = "both", 0.6, "Professional and basic needs mentioned together"
+    elif fr:
+        role, confidence, reasoning = "fr", min(0.95, 0.75 + 0.1 * (len(set(fr)) - 1) + (0.05 if high_urgency else 0)), "Professional response keywords"
+    elif vol and large:
+        role, confidence, reasoning = "both", 0.55, "Basic needs for a large group"
+    elif vol:
+        role, confidence, reasoning = "vol", min(0.95, 0.8 + 0.05 * (len(set(vol)) - 1) - (0.05 if high_urgency else 0)), "Basic needs keywords"
+    else:
+        role, confidence, reasoning = "vol", 0.0, "No rule matched"
+
+    return {
+        "role": role,
+        "roles": list(ROLE_CODES[role]),
+        "confidence": round(confidence, 3),
+        "reasoning": f"Rule-based: {reasoning}",
+        "matches": {category: keywords for category, keywords in found.items() if keywords},
+    }
+
+
+def fallback_roles(text: str, emergency_type: str = "", urgency: str = "", people=None) -> list:
+    """Roles when Gemini is unavailable: the rules at any confidence, else high urgency -> "fr".
+
+    Joke or test wording keeps volunteers unless the text itself asks for responders.
+    """
+    decision = classify_roles(text, emergency_type, urgency, people)
+    if "inappropriate" in decision["matches"]:
+        return ["fr"] if match_keywords(text)["fr"] else ["vol"]
+    if decision["confidence"] > 0:
+        return decision["roles"]
+    return ["fr"] if str(urgency).strip().lower() in ("high", "urgent") else ["vol"]
+
+
+def is_confident(decision: dict, threshold: float = None) -> bool:
+    return decision["confidence"] >= (ROLE_RULES_MIN_CONFIDENCE if threshold is None else threshold)
+
+
+def evaluate_fixtures(path: str, threshold: float = None) -> dict:
+    """Compare the rules with hand-labelled fixtures.
+
+    Each fixture is {"text", "emergency_type", "urgency", "people", "expected_role"}, labelled
+    with the role the Gemini prompt's rules call for.
+    `agreement` is measured on the cases the rules decide on their own; `llm_calls_avoided`
+    is the share of cases that would not reach Gemini.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+
+    decided = agreed = 0
+    disagreements = []
+    for fixture in fixtures:
+        decision = classify_roles(
+            fixture["text"], fixture.get("emergency_type", ""), fixture.get("urgency", ""), fixture.get("people")
+        )
+        if not is_confident(decision, threshold):
+            continue
+        decided += 1
+        if decision["role"] == fixture["expected_role"]:
+            agreed += 1
+        else:
+            disagreements.append({"text": fixture["text"], "rules": decision["role"], "expected": fixture["expected_role"]})
+
+    total = len(fixtures)
+    return {
+        "cases": total,
+        "decided_by_rules": decided,
+        "llm_calls_avoided": round(decided / total, 3) if total else 0.0,
+        "agreement": round(agreed / decided, 3) if decided else 0.0,
+        "disagreements": disagreements,
+    }
+
+
+if __name__ == "__main__":
+    # python -m app.services.role_rules test/role_fixtures.json
+    print(json.dumps(evaluate_fixtures(sys.argv[1] if len(sys.argv) > 1 else "test/role_fixtures.json"), indent=2))
@@ -0,0 +1,43 @@
+from firebase_admin import db
+
+from app.services.metrics import track
+
+
+class WriteBatch:
+    """Collects Realtime Database writes and commits them as one atomic multi-path update.
+
+    Each path is replaced like `ref.set` (None deletes it). Paths in one batch must not
+    be ancestors of each other, the RTDB rejects overlapping multi-path updates.
+    """
+
+    def __init__(self, updates: dict = None):
+        self.updates = dict(updates or {})
+
+    def set(self, path: str, value):
+        self.updates[path.strip("/")] = value
+        return self
+
+    def delete(self, path: str):
+        return self.set(path, None)
+
+    def commit(self, stage: str = "multi_path_update"):
+        """Send all staged writes in a single round trip"""
+        if not self.updates:
+            return
+        with track("rtdb", stage):
+            db.reference("/").update(self.updates)
+        self.updates = {}
+
+    def __len__(self):
+        return len(self.updates)
+
+
+def disaster_status_updates(disaster_id: str, status: str) -> dict:
+    """Paths that change a disaster's status: its record and its disaster_index entry.
+
+    Disaster ids start with the precision-4 geohash their index entry is filed under.
+    """
+    return {
+        f"disasters/{disaster_id}/status": status,
+        f"disaster_index/{disaster_id.split('_')[0]}/{disaster_id}/status": status,
+    }
@@ -0,0 +1,97 @@
+import hashlib
+import re
+import threading
+
+from cachetools import TTLCache
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "for", "with", "is", "are",
+    "we", "i", "me", "my", "our", "us", "need", "needs", "please", "help", "some", "there",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> frozenset:
+    """Lowercase word set of the text without punctuation and filler words"""
+    return frozenset(t for t in _TOKEN_RE.findall(str(text).lower()) if t not in STOPWORDS)
+
+
+def canonicalise_text(text: str) -> str:
+    """Order-insensitive canonical form, so "Trapped on the roof!" == "roof, trapped" """
+    return " ".join(sorted(tokenize(text)))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class TaskResponseCache:
+    """TTL + LRU cache of Gemini task replies keyed by a normalised prompt fingerprint.
+
+    Entries are grouped in buckets (emergency type, urgency, context such as area and
+    resources); with a similarity threshold, a miss on the exact fingerprint falls back
+    to the most similar help text within the same bucket.
+    """
+
+    def __init__(self, name: str, maxsize: int = 512, ttl: int = 900, similarity_threshold: float = None):
+        self.name = name
+        self.similarity_threshold = similarity_threshold
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "similar_hits": 0, "misses": 0, "latency_saved_seconds": 0.0}
+
+    @staticmethod
+    def _bucket(emergency_type, urgency, context) -> tuple:
+        return (str(emergency_type).strip().lower(), str(urgency).strip().lower(), tuple(str(c) for c in context))
+
+    @staticmethod
+    def _key(bucket: tuple, text: str) -> str:
+        raw = "|".join([*bucket[:2], *bucket[2], canonicalise_text(text)])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, emergency_type, urgency, text, context=()):
+        """Return the cached reply (a copy) or None"""
+        bucket = self._bucket(emergency_type, urgency, context)
+        key = self._key(bucket, text)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._stats["hits"] += 1
+            elif self.similarity_threshold is not None:
+                tokens = tokenize(text)
+                best_score = 0.0
+                for candidate in self._cache.values():
+                    if candidate["bucket"] != bucket:
+                        continue
+                    score = jaccard(tokens, candidate["tokens"])
+                    if score >= self.similarity_threshold and score > best_score:
+                        entry, best_score = candidate, score
+                if entry is not None:
+                    self._stats["similar_hits"] += 1
+
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["latency_saved_seconds"] += entry["latency"]
+            return dict(entry["data"])
+
+    def put(self, emergency_type, urgency, text, data: dict, latency: float, context=()):
+        bucket = self._bucket(emergency_type, urgency, context)
+        with self._lock:
+            self._cache[self._key(bucket, text)] = {
+                "bucket": bucket,
+                "tokens": tokenize(text),
+                "data": dict(data),
+                "latency": latency,
+            }
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._cache)
+        stats["gemini_calls_avoided"] = stats["hits"] + stats["similar_hits"]
+        stats["latency_saved_seconds"] = round(stats["latency_saved_seconds"], 3)
+        return stats
@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import db
+
+from app.services.geo_utils import cells_around, haversine_km
+from app.services.metrics import submit_with_context, track
+
+DEFAULT_FEED_RADIUS_KM = 50
+# disaster_index is keyed by precision-4 cells (~40 km); wider radii search precision-3 prefixes
+INDEX_PRECISION = 4
+WIDE_RADIUS_KM = 20
+
+feed_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def parse_cursor(cursor: str) -> tuple:
+    """`since` cursor -> (updated_at, task_id). Accepts a bare timestamp or `<updated_at>:<task_id>`"""
+    if not cursor:
+        return 0, ""
+    updated_at, _, task_id = str(cursor).partition(":")
+    try:
+        return int(updated_at), task_id
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def format_cursor(task: dict) -> str:
+    return f"{task.get('updated_at', 0)}:{task.get('task_id', '')}"
+
+
+def nearby_disaster_ids(latitude: float, longitude: float, radius_km: float) -> list:
+    """Ids of indexed disasters within radius_km, from disaster_index/{geohash4}/{id}"""
+    precision = INDEX_PRECISION if radius_km <= WIDE_RADIUS_KM else INDEX_PRECISION - 1
+    index_ref = db.reference("disaster_index")
+    disaster_ids = []
+    for cell in cells_around(latitude, longitude, precision):
+        with track("rtdb", "fetch_disaster_index"):
+            if precision == INDEX_PRECISION:
+                cells = {cell: index_ref.child(cell).get()}
+            else:
+                cells = index_ref.order_by_key().start_at(cell).end_at(cell + "~").get()
+        for entries in (cells or {}).values():
+            for disaster_id, entry in (entries or {}).items():
+                if not isinstance(entry, dict) or entry.get("status") == "archived":
+                    continue
+                try:
+                    distance = haversine_km(latitude, longitude, float(entry["latitude"]), float(entry["longitude"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                # Tasks can sit away from the report location, so keep a margin of one radius
+                if distance <= 2 * radius_km:
+                    disaster_ids.append(disaster_id)
+    return disaster_ids
+
+
+def fetch_changed_tasks(disaster_id: str, since_updated_at: int) -> list:
+    """Tasks of one disaster with updated_at >= since_updated_at.
+
+    Uses an `updated_at` range query (needs `.indexOn: ["updated_at"]` under tasks/$disaster_id
+    in the database rules); without the index the whole node is read and filtered here.
+    """
+    tasks_ref = db.reference(f"tasks/{disaster_id}")
+    try:
+        with track("rtdb", "fetch_changed_tasks"):
+            tasks = tasks_ref.order_by_child("updated_at").start_at(since_updated_at).get()
+    except Exception as e:
+        print(f"Task feed range query failed for {disaster_id}, reading whole node: {e}")
+        with track("rtdb", "fetch_tasks_full"):
+            tasks = tasks_ref.get()
+    changed = []
+    for task_id, task in (tasks or {}).items():
+        if not isinstance(task, dict) or task.get("updated_at", 0) < since_updated_at:
+            continue
+        changed.append({**task, "task_id": task.get("task_id", task_id), "disaster_id": disaster_id})
+    return changed
+
+
+def get_task_feed(role: str, latitude: float, longitude: float, since: str = None,
+                  radius_km: float = DEFAULT_FEED_RADIUS_KM, limit: int = 50) -> dict:
+    """Tasks for a role ('vol' / 'fr') within radius_km that changed after the `since` cursor.
+
+    Results are ordered by (updated_at, task_id); pass `next_cursor` back as `since` to
+    receive only later changes. `has_more` means another page is already available.
+    """
+    if latitude is None or longitude is None:
+        raise ValueError("No location: pass latitude and longitude or set one on your profile")
+    since_updated_at, since_task_id = parse_cursor(since)
+    disaster_ids = nearby_disaster_ids(latitude, longitude, radius_km)
+
+    futures = [submit_with_context(feed_executor, fetch_changed_tasks, disaster_id, since_updated_at)
+               for disaster_id in disaster_ids]
+    tasks = []
+    for future in futures:
+        for task in future.result():
+            if (task.get("updated_at", 0), task["task_id"]) <= (since_updated_at, since_task_id):
+                continue
+            if role not in task.get("roles", []):
+                continue
+            try:
+                distance = haversine_km(latitude, longitude, float(task["latitude"]), float(task["longitude"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if distance > radius_km:
+                continue
+            task["distance_km"] = round(distance, 3)
+            tasks.append(task)
+
+    tasks.sort(key=lambda task: (task.get("updated_at", 0), task["task_id"]))
+    page = tasks[:limit]
+    return {
+        "tasks": page,
+        "next_cursor": format_cursor(page[-1]) if page else (since or "0"),
+        "has_more": len(tasks) > limit,
+    }
@@ -1,5 +1,5 @@
 import firebase_admin
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from firebase_admin import credentials
 from dotenv import load_dotenv
@@ -19,6 +19,7 @@ from app.api.first_responder import router as first_responder_router
 from app.api.volunteer import router as volunteer_router
 from app.api.private import router as private_router
 from app.api.public import router as public_router
+from app.services.metrics import render_metrics
 
 app = FastAPI()
 
@@ -41,3 +42,8 @@ app.include_router(public_router)
 @app.get("/")
 def read_root():
     return {"status": "running"}
+
+@app.get("/metrics")
+def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)